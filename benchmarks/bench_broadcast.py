@@ -0,0 +1,85 @@
+# benchmarks/bench_broadcast.py
+"""
+Рассылка расписания по синтетической базе подписчиков.
+
+Пользователи раскладываются по группам и программам из настоящих файлов
+расписания, рассылка идёт через run_broadcast в фейковый бот, который только
+считает сообщения. Печатается статистика прогона: подписчики, число
+уникальных отрисовок и время.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_broadcast.py [папка_с_xlsx] [подписчиков]
+"""
+import asyncio
+import datetime
+import glob
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from services import cache  # noqa: E402
+from services.notification import run_broadcast  # noqa: E402
+from utils import user_store  # noqa: E402
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent += 1
+
+
+def make_subscribers(count):
+    rnd = random.Random(count)
+    groups = {course: cache.get_all_groups(course) for course in cache.schedule_cache}
+    users = {}
+    for i in range(count):
+        course = rnd.choice(sorted(groups))
+        users[str(100000000 + i)] = {
+            "course": course,
+            "group": rnd.choice(groups[course]),
+            "notification_time": "07:00",
+            "subscribed": True,
+            "program": rnd.choice(["ФГОС", "МП"]),
+            "language": rnd.choice([None, "Английский", "Немецкий"]),
+        }
+    return users
+
+
+def main():
+    source_dir = os.path.abspath(sys.argv[1] if len(sys.argv) > 1 else "data")
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    files = glob.glob(os.path.join(source_dir, "schedule*.xlsx"))
+    if not files:
+        print(f"В {source_dir} нет файлов schedule*.xlsx")
+        sys.exit(1)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "data"))
+        for path in files:
+            shutil.copy2(path, os.path.join(tmp, "data"))
+        os.chdir(tmp)
+        try:
+            cache.init_cache()
+            users = make_subscribers(count)
+            user_store.save_users(users)
+            bot = FakeBot()
+            monday = datetime.date.today() - datetime.timedelta(days=datetime.date.today().weekday())
+            stats = asyncio.run(run_broadcast(bot, list(users), monday, "сегодня"))
+        finally:
+            os.chdir(cwd)
+
+    print(f"Хранилище: {user_store.USER_STORE}")
+    for key, value in stats.items():
+        print(f"  {key}: {value}")
+    print(f"  сообщений в фейковый бот: {bot.sent}")
+
+
+if __name__ == "__main__":
+    main()
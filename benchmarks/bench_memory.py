@@ -0,0 +1,87 @@
+# benchmarks/bench_memory.py
+"""
+Память, занимаемая расписаниями всех шести курсов.
+
+Сравниваются компактная модель (Lesson/Entry, интернированные строки)
+и прежнее представление словарями, собранное из тех же данных.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_memory.py [папка_с_xlsx]
+"""
+import gc
+import os
+import pickle
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from services.model import FLAG_BLUE, FLAG_GREEN  # noqa: E402
+from services.parser import parse_schedule  # noqa: E402
+
+
+def _copy(text):
+    # Прежний парсер создавал отдельную строку для каждой ячейки
+    return (text + " ")[:-1]
+
+
+def to_dicts(schedule_data):
+    """
+    Представление расписания до перехода на компактную модель.
+    """
+    result = {}
+    for group, days in schedule_data.items():
+        result[group] = {}
+        for day, lessons in days.items():
+            result[group][day] = [
+                {
+                    "number": lesson.number,
+                    "time": _copy(lesson.time),
+                    "entries": [
+                        {
+                            "text": _copy(entry.text),
+                            "program": entry.program_name,
+                            "is_language": entry.is_language,
+                            "cell_color": "blue" if entry.flags & FLAG_BLUE else "green" if entry.flags & FLAG_GREEN else "default",
+                        }
+                        for entry in lesson.entries
+                    ],
+                }
+                for lesson in lessons
+            ]
+    return result
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else "data"
+    paths = [os.path.join(data_dir, f"schedule{course}.xlsx") for course in range(1, 7)]
+    paths = [path for path in paths if os.path.exists(path)]
+    if not paths:
+        print(f"В {data_dir} нет файлов scheduleN.xlsx")
+        sys.exit(1)
+
+    parsed = [parse_schedule(path) for path in paths]
+    dicts, dict_size = measure(lambda: [to_dicts(data) for data in parsed])
+    del dicts
+    # Компактную модель измеряем по уже разобранным данным, пересобрав их копию через pickle
+    blobs = [pickle.dumps(data) for data in parsed]
+    compact, compact_size = measure(lambda: [pickle.loads(blob) for blob in blobs])
+
+    print(f"Курсов: {len(paths)}")
+    print(f"  словари:           {dict_size / 1024:10.0f} КБ")
+    print(f"  компактная модель: {compact_size / 1024:10.0f} КБ")
+    print(f"  экономия: x{dict_size / compact_size:.2f}")
+
+
+if __name__ == "__main__":
+    main()
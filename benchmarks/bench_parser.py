@@ -0,0 +1,50 @@
+# benchmarks/bench_parser.py
+"""
+Сравнение потокового разбора (parse_schedule) с прежним
+(parse_schedule_full) на одном и том же файле.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_parser.py data/schedule1.xlsx [повторов]
+"""
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from services.parser import parse_schedule, parse_schedule_full  # noqa: E402
+
+
+def measure(func, path, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(path)
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    func(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, min(timings), peak
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else os.path.join("data", "schedule1.xlsx")
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    full_data, full_time, full_peak = measure(parse_schedule_full, path, repeat)
+    stream_data, stream_time, stream_peak = measure(parse_schedule, path, repeat)
+
+    if full_data != stream_data:
+        print("ОШИБКА: результаты разбора различаются")
+        sys.exit(1)
+
+    print(f"Файл: {path} (лучшее из {repeat})")
+    print(f"  полная загрузка: {full_time * 1000:8.1f} мс, пик памяти {full_peak / 1024:8.0f} КБ")
+    print(f"  потоковый:       {stream_time * 1000:8.1f} мс, пик памяти {stream_peak / 1024:8.0f} КБ")
+    print(f"  ускорение: x{full_time / stream_time:.2f}")
+
+
+if __name__ == "__main__":
+    main()
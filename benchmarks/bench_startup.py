@@ -0,0 +1,55 @@
+# benchmarks/bench_startup.py
+"""
+Холодный и тёплый старт кэша расписаний (init_cache).
+Файлы schedule*.xlsx копируются во временный каталог, чтобы не трогать
+снимки в рабочей папке data.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_startup.py [папка_с_xlsx]
+"""
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from services import cache  # noqa: E402
+
+
+def timed_init():
+    cache.schedule_cache.clear()
+    start = time.perf_counter()
+    cache.init_cache()
+    return time.perf_counter() - start
+
+
+def main():
+    source_dir = os.path.abspath(sys.argv[1] if len(sys.argv) > 1 else "data")
+    files = glob.glob(os.path.join(source_dir, "schedule*.xlsx"))
+    if not files:
+        print(f"В {source_dir} нет файлов schedule*.xlsx")
+        sys.exit(1)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "data"))
+        for path in files:
+            shutil.copy2(path, os.path.join(tmp, "data"))
+        os.chdir(tmp)
+        try:
+            cold = timed_init()
+            warm = timed_init()
+        finally:
+            os.chdir(cwd)
+
+    print(f"Курсов: {len(cache.schedule_cache)}")
+    print(f"  холодный старт (разбор xlsx): {cold * 1000:8.1f} мс")
+    print(f"  тёплый старт (снимки):        {warm * 1000:8.1f} мс")
+    print(f"  ускорение: x{cold / warm:.1f}")
+
+
+if __name__ == "__main__":
+    main()
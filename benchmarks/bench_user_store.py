@@ -0,0 +1,84 @@
+# benchmarks/bench_user_store.py
+"""
+Сравнение хранилищ пользователей: users.json (utils/json_db) и SQLite (utils/sqlite_db).
+Для каждого размера базы измеряется среднее время чтения профиля
+(четыре get_user_* как в /today), одной записи настройки и, для JSON,
+отложенной записи всего файла на диск (flush).
+
+Запуск из корня репозитория:
+    python benchmarks/bench_user_store.py [размеры через запятую]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from utils import json_db, sqlite_db  # noqa: E402
+
+
+def make_users(count):
+    rnd = random.Random(count)
+    return {
+        str(100000000 + i): {
+            "course": str(rnd.randint(1, 6)),
+            "group": f"ИКБ-{rnd.randint(1, 40):02d}",
+            "notification_time": rnd.choice(["07:00", "08:00", "20:00", None]),
+            "subscribed": rnd.random() < 0.5,
+            "program": rnd.choice(["ФГОС", "МП", None]),
+            "language": None,
+        }
+        for i in range(count)
+    }
+
+
+def per_op(func, ids):
+    start = time.perf_counter()
+    for user_id in ids:
+        func(user_id)
+    return (time.perf_counter() - start) / len(ids)
+
+
+def bench_backend(db, user_ids, reads, writes):
+    def read_profile(user_id):
+        db.get_user_group(user_id)
+        db.get_user_course(user_id)
+        db.get_user_program(user_id)
+        db.get_user_language(user_id)
+
+    read_ids = random.sample(user_ids, reads)
+    write_ids = random.sample(user_ids, writes)
+    return per_op(read_profile, read_ids), per_op(lambda uid: db.set_user_group(uid, "ИКБ-99"), write_ids)
+
+
+def main():
+    sizes = [int(x) for x in sys.argv[1].split(",")] if len(sys.argv) > 1 else [10_000, 100_000]
+    print(f"{'пользователей':>14} {'хранилище':>10} {'чтение профиля, мс':>20} {'запись, мс':>12} {'flush, мс':>10}")
+    for size in sizes:
+        users = make_users(size)
+        user_ids = list(users)
+        with tempfile.TemporaryDirectory() as tmp:
+            json_db.DB_PATH = os.path.join(tmp, "users.json")
+            json_db._users = None
+            json_db.save_users(users)
+            json_db.flush()
+            json_db._users = None
+            json_read, json_write = bench_backend(json_db, user_ids, 2000, 2000)
+            start = time.perf_counter()
+            json_db.flush()
+            json_flush = time.perf_counter() - start
+
+            sqlite_db.DB_PATH = os.path.join(tmp, "users.db")
+            sqlite_db.JSON_PATH = json_db.DB_PATH
+            sqlite_db.load_users()  # перенос из JSON
+            sqlite_read, sqlite_write = bench_backend(sqlite_db, user_ids, 2000, 2000)
+            sqlite_db.close()
+
+        print(f"{size:>14} {'json':>10} {json_read * 1000:>20.3f} {json_write * 1000:>12.3f} {json_flush * 1000:>10.1f}")
+        print(f"{size:>14} {'sqlite':>10} {sqlite_read * 1000:>20.3f} {sqlite_write * 1000:>12.3f} {'-':>10}")
+
+
+if __name__ == "__main__":
+    main()
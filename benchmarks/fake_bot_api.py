@@ -0,0 +1,115 @@
+# benchmarks/fake_bot_api.py
+"""
+Заглушка Bot API для нагрузочных тестов без Telegram.
+
+Отвечает успехом на любой метод: getMe возвращает бота, sendMessage и
+editMessageText — сообщение в тот же чат, getUpdates — пустой список.
+При остановке (Ctrl+C) печатает число вызовов по методам, а с --stats-every
+печатает его периодически — по нему видно, сколько ответов бот уже отправил.
+
+Запуск вместе с диспетчером:
+    python benchmarks/fake_bot_api.py --port 8081 &
+    BOT_API_URL=http://127.0.0.1:8081/bot BOT_MODE=webhook WEBHOOK_URL=https://bot.example.com/telegram python src/dispatcher.py &
+    python benchmarks/replay_updates.py updates.jsonl --repeat 100 --users 1000 --concurrency 8
+"""
+import argparse
+import collections
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Schedule", "username": "schedule_bot"}
+# Пауза getUpdates: иначе бот в режиме polling опрашивал бы заглушку без остановки
+GET_UPDATES_DELAY = 1.0
+
+calls = collections.Counter()
+_lock = threading.Lock()
+_message_id = 0
+
+
+def _params(handler):
+    body = handler.rfile.read(int(handler.headers.get("Content-Length", 0)))
+    content_type = handler.headers.get("Content-Type", "")
+    if "json" in content_type:
+        return json.loads(body or b"{}")
+    return {key: values[0] for key, values in urllib.parse.parse_qs(body.decode("utf-8")).items()}
+
+
+def _message(params):
+    global _message_id
+    with _lock:
+        _message_id += 1
+        message_id = _message_id
+    return {
+        "message_id": int(params.get("message_id") or message_id),
+        "date": int(time.time()),
+        "chat": {"id": int(params.get("chat_id") or 0), "type": "private"},
+        "text": params.get("text", ""),
+    }
+
+
+def _result(method, params):
+    if method == "getme":
+        return BOT_USER
+    if method == "getupdates":
+        time.sleep(GET_UPDATES_DELAY)
+        return []
+    if method in ("sendmessage", "editmessagetext", "editmessagereplymarkup"):
+        return _message(params)
+    return True
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        method = self.path.rstrip("/").rsplit("/", 1)[-1]
+        params = _params(self)
+        with _lock:
+            calls[method] += 1
+        body = json.dumps({"ok": True, "result": _result(method.lower(), params)}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _print_stats():
+    with _lock:
+        stats = dict(calls)
+    print(json.dumps(stats, ensure_ascii=False, sort_keys=True), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка Bot API для нагрузочных тестов")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--stats-every", type=float, default=0, help="печатать счётчики каждые N секунд")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), _Handler)
+    server.daemon_threads = True
+    if args.stats_every > 0:
+        def report():
+            while True:
+                time.sleep(args.stats_every)
+                _print_stats()
+        threading.Thread(target=report, daemon=True).start()
+    print(f"Заглушка Bot API: http://{args.host}:{args.port}/bot", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        _print_stats()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+# benchmarks/replay_updates.py
+"""
+Отправка записанных обновлений Telegram на вебхук бота.
+
+Бот запускается локально с BOT_MODE=webhook, после чего скрипт POST-запросами
+отправляет на адрес вебхука JSON обновлений, как это делает сам Telegram.
+Файл может содержать один объект обновления, JSON-массив обновлений или
+по одному обновлению в строке (JSONL). Печатаются число ответов по
+HTTP-статусам, задержки и пропускная способность.
+
+Запуск из корня репозитория:
+    python benchmarks/replay_updates.py updates.jsonl \
+        [--url http://127.0.0.1:8443/telegram] [--secret ТОКЕН] \
+        [--repeat 1] [--concurrency 1] [--users 1]
+
+При --repeat > 1 к update_id добавляется номер повтора, чтобы PTB не счёл
+обновления одинаковыми. При --users > 1 к id пользователя и чата добавляется
+номер «пользователя» (по кругу), чтобы нагрузка распределялась по воркерам
+dispatcher.py так же, как от множества реальных чатов.
+"""
+import argparse
+import collections
+import json
+import os
+import statistics
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def read_updates(path):
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read().strip()
+    if not content:
+        return []
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError:
+        return [json.loads(line) for line in content.splitlines() if line.strip()]
+    return data if isinstance(data, list) else [data]
+
+
+def expand(updates, repeat):
+    if repeat <= 1:
+        return list(updates)
+    step = max((u.get("update_id", 0) for u in updates), default=0) + 1
+    expanded = []
+    for i in range(repeat):
+        for update in updates:
+            copy = dict(update)
+            copy["update_id"] = update.get("update_id", 0) + i * step
+            expanded.append(copy)
+    return expanded
+
+
+def _shift_ids(value, delta):
+    if isinstance(value, list):
+        return [_shift_ids(item, delta) for item in value]
+    if not isinstance(value, dict):
+        return value
+    shifted = {}
+    for key, item in value.items():
+        if key in ("from", "chat", "user") and isinstance(item, dict) and isinstance(item.get("id"), int):
+            item = dict(item, id=item["id"] + delta)
+        shifted[key] = _shift_ids(item, delta)
+    return shifted
+
+
+def spread_users(updates, users):
+    """
+    Раскладывает обновления по users разным пользователям и чатам.
+    """
+    if users <= 1:
+        return updates
+    return [_shift_ids(update, i % users) for i, update in enumerate(updates)]
+
+
+def post(url, secret, update):
+    body = json.dumps(update, ensure_ascii=False).encode("utf-8")
+    request = urllib.request.Request(url, data=body, method="POST")
+    request.add_header("Content-Type", "application/json")
+    if secret:
+        request.add_header("X-Telegram-Bot-Api-Secret-Token", secret)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except OSError as e:
+        status = type(e).__name__
+    return status, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отправка записанных обновлений на вебхук бота")
+    parser.add_argument("path", help="JSON или JSONL с обновлениями")
+    parser.add_argument("--url", default=None, help="адрес вебхука")
+    parser.add_argument("--secret", default=os.getenv("WEBHOOK_SECRET_TOKEN"), help="секретный токен вебхука")
+    parser.add_argument("--repeat", type=int, default=1, help="сколько раз повторить набор")
+    parser.add_argument("--concurrency", type=int, default=1, help="число параллельных запросов")
+    parser.add_argument("--users", type=int, default=1, help="на сколько разных пользователей разложить обновления")
+    args = parser.parse_args()
+
+    url = args.url or "http://127.0.0.1:{}/{}".format(
+        os.getenv("WEBHOOK_PORT", "8443"), os.getenv("WEBHOOK_PATH", "telegram")
+    )
+    updates = spread_users(expand(read_updates(args.path), args.repeat), args.users)
+    if not updates:
+        print("Нет обновлений для отправки")
+        return 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        results = list(pool.map(lambda u: post(url, args.secret, u), updates))
+    elapsed = time.perf_counter() - start
+
+    statuses = collections.Counter(status for status, _ in results)
+    latencies = sorted(ms for _, ms in results)
+    print(f"Отправлено: {len(results)} за {elapsed:.2f} с ({len(results) / elapsed:.1f} обновлений/с)")
+    print("Статусы:", ", ".join(f"{status}: {count}" for status, count in statuses.most_common()))
+    print(
+        f"Задержка, мс: медиана {statistics.median(latencies):.1f}, "
+        f"p95 {latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]:.1f}, "
+        f"макс {latencies[-1]:.1f}"
+    )
+    return 0 if set(statuses) == {200} else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+# benchmarks/run_suite.py
+"""
+Набор бенчмарков на синтетических данных с результатами в JSON.
+
+Во временной папке генерируются schedule1.xlsx – schedule6.xlsx и базы
+пользователей (см. synthetic.py), после чего измеряются:
+  - parse            — разбор каждого файла parse_schedule;
+  - schedule_day     — get_schedule_for_day по всем группам, дням и программам
+                       без кэша отрисовки (cold) и с ним (warm);
+  - schedule_week    — то же для get_schedule_for_week;
+  - json_db          — загрузка users.json, get_profile, update_profile и flush;
+  - daily_broadcast  — полный прогон send_daily_schedule в фейковый бот
+                       (хранилище — по USER_STORE).
+
+Каждый результат — объект {"name", "params", "metrics"}; времена в миллисекундах.
+Результаты двух версий сравниваются флагом --compare.
+
+Запуск из корня репозитория:
+    python benchmarks/run_suite.py [--users 1000,10000,100000] [--repeat 3]
+                                   [--output results.json] [--compare прошлый.json]
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import synthetic  # noqa: E402
+from services import cache, notification  # noqa: E402
+from services.parser import parse_schedule  # noqa: E402
+from utils import json_db, user_store  # noqa: E402
+
+PROGRAMS = [None, "ФГОС", "МП"]
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = 0
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent += 1
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def result(name, params, **metrics):
+    return {"name": name, "params": params, "metrics": {k: round(v, 4) for k, v in metrics.items()}}
+
+
+def bench_parse(repeat):
+    results = []
+    for course in synthetic.COURSES:
+        path = cache.course_file_path(course)
+        ms = best_of(lambda: parse_schedule(path), repeat)
+        results.append(result("parse", {"course": course, "bytes": os.path.getsize(path)}, ms=ms))
+    return results
+
+
+def _lookups():
+    return [
+        (course, group, program)
+        for course in synthetic.COURSES
+        for group in cache.get_all_groups(course)
+        for program in PROGRAMS
+    ]
+
+
+def bench_schedule(repeat):
+    lookups = _lookups()
+
+    def day_pass():
+        for course, group, program in lookups:
+            for day in range(6):
+                cache.get_schedule_for_day(group, day, course, program=program, week_type="upper")
+
+    def week_pass():
+        for course, group, program in lookups:
+            cache.get_schedule_for_week(group, course, program=program, week_type="upper")
+
+    results = []
+    for name, func, calls in (
+        ("schedule_day", day_pass, len(lookups) * 6),
+        ("schedule_week", week_pass, len(lookups)),
+    ):
+        def cold():
+            cache.render_cache.invalidate()
+            func()
+
+        cold_ms = best_of(cold, repeat)
+        func()
+        warm_ms = best_of(func, repeat)
+        results.append(result(
+            name, {"calls": calls},
+            cold_us_per_call=cold_ms * 1000 / calls,
+            warm_us_per_call=warm_ms * 1000 / calls,
+        ))
+    return results
+
+
+def bench_json_db(size, ops=2000):
+    path = os.path.join("data", f"users_{size}.json")
+    synthetic.generate_users(path, size)
+    json_db.DB_PATH = path
+    json_db._users = None
+    start = time.perf_counter()
+    users = json_db.load_users()
+    load_ms = (time.perf_counter() - start) * 1000
+
+    rnd = random.Random(size)
+    ids = rnd.sample(list(users), min(ops, size))
+    start = time.perf_counter()
+    for user_id in ids:
+        json_db.get_profile(user_id)
+    get_us = (time.perf_counter() - start) * 1e6 / len(ids)
+    start = time.perf_counter()
+    for user_id in ids:
+        json_db.update_profile(user_id, group="ИКБ-100")
+    update_us = (time.perf_counter() - start) * 1e6 / len(ids)
+    start = time.perf_counter()
+    json_db.flush()
+    flush_ms = (time.perf_counter() - start) * 1000
+    return result(
+        "json_db", {"users": size, "ops": len(ids)},
+        load_ms=load_ms, get_profile_us=get_us, update_profile_us=update_us, flush_ms=flush_ms,
+    )
+
+
+def _broadcast_slot():
+    # Утренний слот шлёт расписание на сегодня, вечерний — на завтра; воскресенье рассылка пропускает
+    today = datetime.datetime.now(notification.TIMEZONE).weekday()
+    return "20:00" if today == 6 else "07:00"
+
+
+def bench_broadcast(size):
+    slot = _broadcast_slot()
+    users = synthetic.make_users(size)
+    for user in users.values():
+        user["notification_time"] = slot
+    user_store.save_users(users)
+    notification.build_index(users)
+    bot = FakeBot()
+    context = types.SimpleNamespace(bot=bot, job=types.SimpleNamespace(data=slot))
+    cache.render_cache.invalidate()
+    start = time.perf_counter()
+    stats = asyncio.run(notification.send_daily_schedule(context)) or {}
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    return result(
+        "daily_broadcast", {"users": size, "store": user_store.USER_STORE, "slot": slot},
+        elapsed_ms=elapsed_ms,
+        subscribers=stats.get("subscribers", 0),
+        distinct_renders=stats.get("distinct_renders", 0),
+        render_ms=stats.get("render_ms", 0),
+        sent=bot.sent,
+        messages_per_second=bot.sent / elapsed_ms * 1000 if elapsed_ms else 0,
+    )
+
+
+def metadata():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+
+
+def run(sizes, repeat):
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            synthetic.generate_schedules("data", seed=1)
+            results += bench_parse(repeat)
+            cache.init_cache()
+            results += bench_schedule(repeat)
+            for size in sizes:
+                results.append(bench_json_db(size))
+            for size in sizes:
+                results.append(bench_broadcast(size))
+        finally:
+            os.chdir(cwd)
+    return {"meta": metadata(), "results": results}
+
+
+def _key(item):
+    return item["name"], json.dumps(item["params"], sort_keys=True)
+
+
+def compare(base, current):
+    """
+    Печатает в stderr отношение метрик текущего прогона к прошлому (меньше 1 — быстрее для времён).
+    """
+    previous = {_key(item): item["metrics"] for item in base["results"]}
+    print(f"Сравнение с {base['meta'].get('commit')} ({base['meta'].get('timestamp')}):", file=sys.stderr)
+    for item in current["results"]:
+        old = previous.get(_key(item))
+        if not old:
+            continue
+        for metric, value in item["metrics"].items():
+            if old.get(metric):
+                print(f"  {item['name']} {item['params']} {metric}: {old[metric]} -> {value} (x{value / old[metric]:.2f})", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарки бота на синтетических данных")
+    parser.add_argument("--users", default="1000,10000,100000", help="размеры базы пользователей через запятую")
+    parser.add_argument("--repeat", type=int, default=3, help="повторов для разбора и отрисовки")
+    parser.add_argument("--output", default=None, help="куда записать JSON (по умолчанию stdout)")
+    parser.add_argument("--compare", default=None, help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+
+    sizes = sorted(int(x) for x in args.users.split(",") if x)
+    report = run(sizes, args.repeat)
+    payload = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(payload)
+    else:
+        print(payload)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
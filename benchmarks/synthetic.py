@@ -0,0 +1,155 @@
+# benchmarks/synthetic.py
+"""
+Генераторы синтетических данных для бенчмарков.
+
+generate_schedule() создаёт scheduleN.xlsx в раскладке, которую ожидает
+services.parser: названия групп в HEADER_ROW (пустая ячейка — подгруппа
+предыдущей группы), номер и время пары в NUMBER_COLUMN/TIME_COLUMN, строки
+дней по DAY_RANGES. В ячейках встречаются варианты через "|", деление по
+неделям через "/", пометки ФГОС/МП, синие (7DB4F0) и зелёные (70AD47)
+ячейки с языками.
+
+generate_users() создаёт users.json заданного размера с профилями
+по тем же группам.
+
+Запуск из корня репозитория:
+    python benchmarks/synthetic.py папка [--users 1000,10000,100000] [--seed 1]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import openpyxl  # noqa: E402
+from openpyxl.styles import PatternFill  # noqa: E402
+
+from services.parser import DAY_RANGES, HEADER_ROW, NUMBER_COLUMN, TIME_COLUMN, GROUP_COLUMNS  # noqa: E402
+
+COURSES = ["1", "2", "3", "4", "5", "6"]
+BLUE_FILL = PatternFill("solid", fgColor="FF7DB4F0")
+GREEN_FILL = PatternFill("solid", fgColor="FF70AD47")
+LESSON_TIMES = [
+    "9.00-10.20", "10.30-11.50", "12.00-13.20", "13.30-14.50",
+    "15.00-16.20", "16.30-17.50", "18.00-19.20", "19.30-20.50",
+]
+LANGUAGES = ["Английский", "Немецкий", "Французский", "Испанский", "Китайский"]
+SUBJECTS = [
+    "Математический анализ", "Линейная алгебра", "Программирование", "Физика",
+    "История", "Философия", "Экономика", "Право", "Базы данных", "Физкультура",
+]
+NOTIFICATION_TIMES = ["07:00", "08:00", "09:00", "10:00", "20:00"]
+
+
+def group_names(course):
+    """
+    Названия групп курса в порядке столбцов. Каждая третья колонка — подгруппа
+    (пустой заголовок), поэтому групп меньше, чем столбцов.
+    """
+    return [f"ИКБ-{course}{i:02d}" for i, _ in enumerate(GROUP_COLUMNS) if i % 3 != 2]
+
+
+def _lesson_text(rnd):
+    subject = rnd.choice(SUBJECTS)
+    room = f"ауд. {rnd.randint(100, 599)}"
+    kind = rnd.random()
+    if kind < 0.25:
+        return f"{subject} ФГОС {room} | {rnd.choice(SUBJECTS)} МП {room}"
+    if kind < 0.5:
+        return f"{subject} {room} / {rnd.choice(SUBJECTS)} {room}"
+    return f"{subject} {room}"
+
+
+def _language_text(rnd):
+    first, second = rnd.sample(LANGUAGES, 2)
+    if rnd.random() < 0.5:
+        return f"{first} язык ФГОС | {second} язык МП"
+    return f"{first} язык / {second} язык"
+
+
+def generate_schedule(path, course="1", seed=None, fill_ratio=0.7):
+    """
+    Записывает в path синтетический файл расписания курса course.
+    fill_ratio — доля непустых ячеек уроков.
+    """
+    rnd = random.Random(f"{course}:{seed}")
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    for i, col in enumerate(GROUP_COLUMNS):
+        if i % 3 != 2:
+            ws.cell(row=HEADER_ROW, column=col, value=f"ИКБ-{course}{i:02d}")
+    for rows in DAY_RANGES.values():
+        for number, row in enumerate(rows, start=1):
+            ws.cell(row=row, column=NUMBER_COLUMN, value=number)
+            if number > len(LESSON_TIMES):
+                continue  # последняя строка дня без времени пропускается парсером
+            ws.cell(row=row, column=TIME_COLUMN, value=LESSON_TIMES[number - 1])
+            for col in GROUP_COLUMNS:
+                x = rnd.random()
+                if x >= fill_ratio:
+                    continue
+                if x < fill_ratio * 0.2:
+                    ws.cell(row=row, column=col, value=_language_text(rnd)).fill = GREEN_FILL
+                elif x < fill_ratio * 0.35:
+                    ws.cell(row=row, column=col, value=_lesson_text(rnd)).fill = BLUE_FILL
+                else:
+                    ws.cell(row=row, column=col, value=_lesson_text(rnd))
+    wb.save(path)
+    return path
+
+
+def generate_schedules(directory, seed=None):
+    """
+    Создаёт schedule1.xlsx – schedule6.xlsx в directory, возвращает пути.
+    """
+    os.makedirs(directory, exist_ok=True)
+    return [
+        generate_schedule(os.path.join(directory, f"schedule{course}.xlsx"), course, seed)
+        for course in COURSES
+    ]
+
+
+def make_users(count, seed=None, subscribed_ratio=0.6):
+    """
+    Возвращает словарь пользователей в формате users.json.
+    """
+    rnd = random.Random(f"users:{count}:{seed}")
+    groups = {course: group_names(course) for course in COURSES}
+    users = {}
+    for i in range(count):
+        course = rnd.choice(COURSES)
+        users[str(100000000 + i)] = {
+            "course": course,
+            "group": rnd.choice(groups[course]),
+            "notification_time": rnd.choice(NOTIFICATION_TIMES),
+            "subscribed": rnd.random() < subscribed_ratio,
+            "program": rnd.choice(["ФГОС", "МП", None]),
+            "language": rnd.choice([None, *LANGUAGES]),
+        }
+    return users
+
+
+def generate_users(path, count, seed=None):
+    users = make_users(count, seed)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(users, f, ensure_ascii=False, indent=4)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетические расписания и базы пользователей")
+    parser.add_argument("directory")
+    parser.add_argument("--users", default="1000,10000,100000", help="размеры users.json через запятую")
+    parser.add_argument("--seed", default=None)
+    args = parser.parse_args()
+
+    for path in generate_schedules(args.directory, args.seed):
+        print(path)
+    for size in (int(x) for x in args.users.split(",") if x):
+        print(generate_users(os.path.join(args.directory, f"users_{size}.json"), size, args.seed))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,31 @@
 # src/bot.py
+import asyncio
 import logging
-from telegram.ext import ApplicationBuilder, JobQueue
-from config import BOT_TOKEN
+import queue
+import signal
+import sys
+import threading
+import time
+from telegram import Update
+from telegram.ext import ApplicationBuilder
+from config import (
+    BOT_TOKEN, BOT_API_URL, CONCURRENT_UPDATES, BOT_MODE,
+    WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_URL, WEBHOOK_SECRET_TOKEN,
+    WEBHOOK_CERT, WEBHOOK_KEY, WEBHOOK_MAX_CONNECTIONS,
+)
 from handlers.start_handler import start_handler, course_callback_handler
 from handlers.schedule_handler import today_handler, tomorrow_handler, week_handler, week_callback_handler, nextweek_callback_handler, nextweek_handler
 from handlers.settings_handler import settings_handler, settings_callback_handler
 from handlers.subscribe_handler import subscribe_handler, unsubscribe_handler
+from handlers.admin_handler import profile_handler
+from handlers.group_handler import group_handler, pick_group_callback_handler, inline_group_handler
+from handlers.ics_handler import ics_handler
 from services.notification import schedule_jobs
-from services.cache import init_cache
+from services.watcher import schedule_reload_jobs
+from services.cache import init_cache, shutdown_process_pool
+from utils.user_store import schedule_store_jobs, flush_users
+from services.outbound import sender
+from utils import metrics, profiling
 
 
 logging.basicConfig(
@@ -15,17 +33,53 @@ logging.basicConfig(
     level=logging.INFO
 )
 
-def main():
-    # Инициализируем кэш (например, парсинг Excel)
-    init_cache()
+# Период сигнала «жив», который воркер подаёт dispatcher.py, секунды
+HEARTBEAT_INTERVAL = 1
+
+async def post_init(application):
+    # Очередь исходящих сообщений работает в цикле событий приложения
+    await sender.start()
 
-    # Создаем приложение
-    application = ApplicationBuilder().token(BOT_TOKEN).build()
+async def post_stop(application):
+    # Досылаем очередь, пока бот ещё не закрыл соединение с API
+    await sender.stop()
 
-    # Явно создаем JobQueue и запускаем её
-    job_queue = JobQueue()
-    job_queue.set_application(application)
-    job_queue.start()
+def run_webhook(application):
+    """
+    Запускает встроенный HTTP-сервер PTB и регистрирует вебхук в Telegram.
+    Остановка по SIGINT/SIGTERM проходит тот же путь, что и у run_polling():
+    post_stop досылает очередь, затем main() сохраняет пользователей.
+    """
+    logging.getLogger(__name__).info(
+        "Режим webhook: %s:%s/%s", WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH
+    )
+    application.run_webhook(
+        listen=WEBHOOK_LISTEN,
+        port=WEBHOOK_PORT,
+        url_path=WEBHOOK_PATH,
+        webhook_url=WEBHOOK_URL,
+        secret_token=WEBHOOK_SECRET_TOKEN,
+        cert=WEBHOOK_CERT,
+        key=WEBHOOK_KEY,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+    )
+
+def build_application(updater=True):
+    """
+    Собирает приложение с обработчиками и периодическими задачами.
+    updater=False — для воркера dispatcher.py: обновления приходят из очереди диспетчера.
+    """
+    builder = ApplicationBuilder().token(BOT_TOKEN).base_url(BOT_API_URL).post_init(post_init).post_stop(post_stop)
+    if not updater:
+        builder = builder.updater(None)
+    if CONCURRENT_UPDATES > 0:
+        # Обработчики обёрнуты в per_user, поэтому параллельны только разные пользователи
+        builder = builder.concurrent_updates(CONCURRENT_UPDATES)
+    application = builder.build()
+
+    # Используем JobQueue приложения: она запускается вместе с run_polling().
+    # Отдельно созданная JobQueue, чей start() не вызывался через await, задачи не выполняла.
+    job_queue = application.job_queue
     
     # Регистрируем обработчики команд
     application.add_handler(start_handler)
@@ -42,12 +96,109 @@ def main():
     application.add_handler(settings_callback_handler)
     application.add_handler(subscribe_handler)
     application.add_handler(unsubscribe_handler)
+    application.add_handler(profile_handler)
+    application.add_handler(group_handler)
+    application.add_handler(pick_group_callback_handler)
+    application.add_handler(inline_group_handler)
+    application.add_handler(ics_handler)
 
     # Передаем созданный job_queue напрямую в schedule_jobs
     schedule_jobs(job_queue)
+    # Периодическая проверка xlsx на изменения и горячая перезагрузка расписаний
+    schedule_reload_jobs(job_queue)
+    # Периодическая запись базы пользователей (для USER_STORE=json)
+    schedule_store_jobs(job_queue)
+    # Закрытие окна профилирования, открытого при старте
+    profiling.schedule_stop(job_queue)
+    return application
+
+def _prepare():
+    # Метрики поднимаются первыми, чтобы в них попало время прогрева кэша
+    metrics.start_server()
+    # Окно профилирования из PROFILE_MODE охватывает и прогрев кэша
+    profiling.start_from_env()
+
+    # Инициализируем кэш (например, парсинг Excel)
+    init_cache()
+
+def _cleanup():
+    shutdown_process_pool()
+    # Сохраняем изменения пользователей, накопленные с последней записи
+    flush_users()
+    metrics.stop_server()
+    # Если окно профилирования ещё открыто, сохраняем то, что успели собрать
+    profiling.stop()
+
+def main():
+    if BOT_MODE == "webhook" and not WEBHOOK_URL:
+        logging.getLogger(__name__).error("При BOT_MODE=webhook нужен WEBHOOK_URL — внешний https-адрес, который сообщается Telegram")
+        return 1
+    _prepare()
+    application = build_application()
 
     # Запускаем бота
-    application.run_polling()
+    try:
+        if BOT_MODE == "webhook":
+            run_webhook(application)
+        else:
+            application.run_polling()
+    finally:
+        _cleanup()
+
+def _read_updates(updates, loop, application, stop, stopping):
+    """
+    Поток воркера: читает обновления из очереди диспетчера и передаёт их
+    в update_queue приложения. None в очереди — команда завершиться.
+    """
+    while not stopping.is_set():
+        try:
+            data = updates.get(timeout=HEARTBEAT_INTERVAL)
+        except queue.Empty:
+            continue
+        if data is None:
+            break
+        update = Update.de_json(data, application.bot)
+        loop.call_soon_threadsafe(application.update_queue.put_nowait, update)
+    loop.call_soon_threadsafe(stop.set)
+
+async def _serve_shard(application, updates, heartbeat):
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    stopping = threading.Event()
+    reader = threading.Thread(
+        target=_read_updates, args=(updates, loop, application, stop, stopping),
+        name="dispatch-reader", daemon=True
+    )
+    async with application:
+        await post_init(application)
+        await application.start()
+        reader.start()
+        # Сигнал «жив» подаёт цикл событий: если он завис на обработчике, диспетчер это увидит
+        while not stop.is_set():
+            heartbeat.value = time.time()
+            try:
+                await asyncio.wait_for(stop.wait(), HEARTBEAT_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+        stopping.set()
+        await loop.run_in_executor(None, reader.join)
+        await application.stop()
+        await post_stop(application)
+
+def run_worker(updates, heartbeat):
+    """
+    Точка входа воркера dispatcher.py: тот же бот, но обновления приходят
+    из очереди updates, а в heartbeat (multiprocessing.Value) пишется время
+    последнего сигнала «жив».
+    """
+    _prepare()
+    application = build_application(updater=False)
+    try:
+        asyncio.run(_serve_shard(application, updates, heartbeat))
+    finally:
+        _cleanup()
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
@@ -5,6 +5,88 @@ from dotenv import load_dotenv
 load_dotenv()
 
 BOT_TOKEN = os.getenv('TOKEN', 'YOUR_DEFAULT_TOKEN')
+# Адрес Bot API (например, собственного сервера telegram-bot-api или заглушки для нагрузочных тестов)
+BOT_API_URL = os.getenv('BOT_API_URL', 'https://api.telegram.org/bot')
 # CURRENT_WEEK_PARITY = "even" означает: если номер недели чётный → верхняя, иначе нижняя.
 # Если "odd", то наоборот.
 CURRENT_WEEK_PARITY = os.getenv('CURRENT_WEEK_PARITY', 'even').lower()
+
+# Границы семестра для экспорта /ics (ГГГГ-ММ-ДД), задаются только вместе. Если не заданы,
+# берётся семестр по дате: с января по июнь — весенний (1 февраля – 30 июня),
+# с июля по декабрь — осенний (1 сентября – 31 декабря).
+SEMESTER_START = os.getenv('SEMESTER_START', '')
+SEMESTER_END = os.getenv('SEMESTER_END', '')
+
+# Период (в секундах) проверки файлов scheduleN.xlsx на изменения. 0 — не проверять.
+SCHEDULE_RELOAD_INTERVAL = int(os.getenv('SCHEDULE_RELOAD_INTERVAL', '60'))
+
+# Сообщать подписчикам, что расписание их группы изменилось после перезагрузки xlsx (1/0)
+NOTIFY_SCHEDULE_CHANGES = os.getenv('NOTIFY_SCHEDULE_CHANGES', '1') == '1'
+
+# Количество процессов для разбора xlsx при промахе кэша и горячей перезагрузке
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', '2'))
+
+# Сколько процессов разбирают листы одной большой книги параллельно (1 — по очереди)
+PARSE_SHEET_WORKERS = int(os.getenv('PARSE_SHEET_WORKERS', '2'))
+
+# Общее хранилище расписаний data/schedule.store, отображаемое в память:
+# "" — не использовать, "publish" — разбирать xlsx и публиковать хранилище,
+# "map" — только читать хранилище, опубликованное другим процессом
+SCHEDULE_STORE = os.getenv('SCHEDULE_STORE', '').lower()
+
+# Максимальное число готовых текстов расписания в кэше отрисовки
+RENDER_CACHE_SIZE = int(os.getenv('RENDER_CACHE_SIZE', '4096'))
+
+# Хранилище пользователей: "sqlite" (data/users.db) или "json" (data/users.json)
+USER_STORE = os.getenv('USER_STORE', 'sqlite').lower()
+
+# Период (в секундах) записи users.json на диск при USER_STORE=json
+USERS_FLUSH_INTERVAL = int(os.getenv('USERS_FLUSH_INTERVAL', '5'))
+
+# Сколько обновлений обрабатывать одновременно. 0 — по одному, как раньше.
+# Обновления одного пользователя всегда обрабатываются по очереди.
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '0'))
+
+# Исходящие сообщения: общий лимит и лимит на один чат (сообщений в секунду),
+# число одновременных запросов к API и число повторов при ошибках
+OUTBOUND_GLOBAL_RATE = float(os.getenv('OUTBOUND_GLOBAL_RATE', '25'))
+OUTBOUND_PER_CHAT_RATE = float(os.getenv('OUTBOUND_PER_CHAT_RATE', '1'))
+OUTBOUND_WORKERS = int(os.getenv('OUTBOUND_WORKERS', '8'))
+OUTBOUND_MAX_RETRIES = int(os.getenv('OUTBOUND_MAX_RETRIES', '3'))
+
+# Режим получения обновлений: "polling" (по умолчанию) или "webhook"
+BOT_MODE = os.getenv('BOT_MODE', 'polling').lower()
+
+# Настройки вебхука (используются при BOT_MODE=webhook).
+# WEBHOOK_URL — внешний https-адрес, который сообщается Telegram (например, адрес
+# балансировщика); обязателен, без него бот в режиме webhook не запускается.
+WEBHOOK_LISTEN = os.getenv('WEBHOOK_LISTEN', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', 'telegram')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL') or None
+# Секрет из заголовка X-Telegram-Bot-Api-Secret-Token; запросы без него отклоняются
+WEBHOOK_SECRET_TOKEN = os.getenv('WEBHOOK_SECRET_TOKEN') or None
+# Сертификат и ключ для HTTPS без внешнего прокси. Без них сервер слушает обычный HTTP.
+WEBHOOK_CERT = os.getenv('WEBHOOK_CERT') or None
+WEBHOOK_KEY = os.getenv('WEBHOOK_KEY') or None
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', '40'))
+
+# Запуск через dispatcher.py: число процессов-воркеров, через сколько секунд
+# без сигнала «жив» воркер перезапускается и сколько обновлений может ждать
+# в очереди одного воркера (при переполнении вебхук отвечает 503, Telegram повторит)
+DISPATCH_WORKERS = int(os.getenv('DISPATCH_WORKERS', '4'))
+DISPATCH_HEARTBEAT_TIMEOUT = int(os.getenv('DISPATCH_HEARTBEAT_TIMEOUT', '30'))
+DISPATCH_QUEUE_SIZE = int(os.getenv('DISPATCH_QUEUE_SIZE', '1000'))
+
+# Метрики Prometheus на http://METRICS_ADDR:METRICS_PORT/metrics. 0 — метрики выключены.
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_ADDR = os.getenv('METRICS_ADDR', '127.0.0.1')
+
+# Профилирование: PROFILE_MODE = "cpu" или "memory" открывает окно профилирования при старте
+# на PROFILE_SECONDS секунд (дампы в data/profiles/). Пусто — выключено.
+PROFILE_MODE = os.getenv('PROFILE_MODE', '').lower()
+PROFILE_SECONDS = int(os.getenv('PROFILE_SECONDS', '300'))
+# Обработчики дольше этого порога (мс) пишутся в лог. 0 — не отслеживать.
+SLOW_HANDLER_MS = int(os.getenv('SLOW_HANDLER_MS', '1000'))
+# Telegram ID администраторов через запятую (команда /profile)
+ADMIN_IDS = {int(x) for x in os.getenv('ADMIN_IDS', '').split(',') if x.strip()}
@@ -0,0 +1,379 @@
+# src/dispatcher.py
+"""
+Запуск бота несколькими процессами.
+
+Фронт-процесс получает обновления (вебхук или long polling — по BOT_MODE, как bot.py)
+и раскладывает их по DISPATCH_WORKERS воркерам по id отправителя. Обновления одного
+пользователя (из личного чата, группы или inline-режима) всегда попадают в один
+процесс, поэтому сохраняются порядок обработки и context.user_data, а индекс
+рассылки пользователя живёт только в его воркере. Воркер — обычный бот из bot.py без собственного получения
+обновлений; ежедневную рассылку и уведомления об изменениях он отправляет
+только подписчикам своего шарда (utils/sharding.py).
+
+Фронт следит за воркерами: процесс, который завершился или дольше
+DISPATCH_HEARTBEAT_TIMEOUT секунд не подавал сигнал «жив», перезапускается.
+Состояние воркеров отдаётся по GET /healthz (в режиме webhook — на порту вебхука).
+
+Требуется USER_STORE=sqlite: база пользователей общая для всех процессов.
+При заданном SCHEDULE_STORE воркер 0 разбирает xlsx и публикует общее
+хранилище расписаний, остальные отображают его в память.
+
+Запуск: python src/dispatcher.py
+"""
+import asyncio
+import json
+import logging
+import multiprocessing
+import queue
+import signal
+import ssl
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import config
+from config import (
+    BOT_TOKEN, BOT_API_URL, BOT_MODE, USER_STORE,
+    DISPATCH_WORKERS, DISPATCH_HEARTBEAT_TIMEOUT, DISPATCH_QUEUE_SIZE,
+    WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_URL, WEBHOOK_SECRET_TOKEN,
+    WEBHOOK_CERT, WEBHOOK_KEY, WEBHOOK_MAX_CONNECTIONS,
+)
+from utils.sharding import shard_of
+
+logger = logging.getLogger("dispatcher")
+
+# Сколько ждать первого сигнала «жив» после запуска воркера (прогрев кэша), секунды
+STARTUP_SECONDS = 300
+# Период проверки воркеров, секунды
+HEALTH_INTERVAL = 2
+# Сколько ждать завершения воркеров при остановке (меньше stop_grace_period в docker-compose)
+STOP_SECONDS = 25
+# Таймаут long polling getUpdates, секунды
+POLL_TIMEOUT = 10
+
+
+def _worker_main(index, count, updates, heartbeat):
+    """
+    Выполняется в процессе воркера. Настройки правятся до импорта модулей бота:
+    они читают значения из config при импорте.
+    """
+    if config.SCHEDULE_STORE:
+        config.SCHEDULE_STORE = "publish" if index == 0 else "map"
+    if config.METRICS_PORT:
+        config.METRICS_PORT += index
+    from utils import sharding
+    sharding.configure(index, count)
+    import bot
+    bot.run_worker(updates, heartbeat)
+
+
+def shard_key_of(data):
+    """
+    Ключ шарда обновления без разбора в объекты PTB: id отправителя или,
+    если его нет (посты каналов и т.п.), id чата.
+    """
+    for key, value in data.items():
+        if key == "update_id" or not isinstance(value, dict):
+            continue
+        user = value.get("from") or value.get("user")
+        if user:
+            return user["id"]
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if chat:
+            return chat["id"]
+    return 0
+
+
+class Worker:
+    def __init__(self, ctx, index, count):
+        self.ctx = ctx
+        self.index = index
+        self.count = count
+        self.heartbeat = ctx.Value("d", 0.0, lock=False)
+        self.restarts = 0
+        self.routed = 0
+        self.process = None
+        self.updates = None
+        self.started = 0.0
+        # Защищает подмену очереди при перезапуске от одновременной записи из потоков приёма
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            self.updates = self.ctx.Queue(DISPATCH_QUEUE_SIZE)
+            self.heartbeat.value = 0.0
+            self.started = time.time()
+            self.process = self.ctx.Process(
+                target=_worker_main, args=(self.index, self.count, self.updates, self.heartbeat),
+                name=f"bot-worker-{self.index}"
+            )
+            self.process.start()
+        logger.info("Воркер %d запущен, pid %s", self.index, self.process.pid)
+
+    def put(self, data, timeout=None):
+        with self._lock:
+            try:
+                if timeout is None:
+                    self.updates.put_nowait(data)
+                else:
+                    self.updates.put(data, timeout=timeout)
+            except queue.Full:
+                return False
+            self.routed += 1
+            return True
+
+    def queued(self):
+        try:
+            return self.updates.qsize()
+        except NotImplementedError:
+            return None
+
+    def ready(self):
+        return self.heartbeat.value > 0
+
+    def problem(self, now):
+        """
+        Причина перезапуска или None, если воркер в порядке.
+        """
+        if not self.process.is_alive():
+            return f"завершился с кодом {self.process.exitcode}"
+        if self.ready():
+            silence = now - self.heartbeat.value
+            if silence > DISPATCH_HEARTBEAT_TIMEOUT:
+                return f"не отвечает {silence:.0f} с"
+        elif now - self.started > STARTUP_SECONDS:
+            return f"не запустился за {STARTUP_SECONDS} с"
+        return None
+
+    def restart(self, reason):
+        lost = self.queued()
+        logger.warning(
+            "Воркер %d (pid %s) %s, перезапуск; потеряно обновлений в очереди: %s",
+            self.index, self.process.pid, reason, lost
+        )
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(5)
+        # Очередь мёртвого процесса могла остаться заблокированной: создаём новую
+        self.updates.cancel_join_thread()
+        self.restarts += 1
+        self.start()
+
+    def stop(self):
+        try:
+            self.updates.put(None, timeout=1)
+        except queue.Full:
+            self.process.terminate()
+
+    def status(self, now):
+        return {
+            "index": self.index,
+            "pid": self.process.pid,
+            "alive": self.process.is_alive(),
+            "ready": self.ready(),
+            "heartbeat_age": round(now - self.heartbeat.value, 1) if self.ready() else None,
+            "restarts": self.restarts,
+            "routed": self.routed,
+            "queued": self.queued(),
+        }
+
+
+class Dispatcher:
+    def __init__(self, count):
+        ctx = multiprocessing.get_context("spawn")
+        self.workers = [Worker(ctx, index, count) for index in range(count)]
+        self._stopping = threading.Event()
+
+    def start(self):
+        first, *rest = self.workers
+        first.start()
+        if config.SCHEDULE_STORE:
+            # Воркер 0 публикует хранилище: остальные стартуют, когда оно готово
+            while not first.ready() and first.problem(time.time()) is None:
+                time.sleep(0.5)
+        for worker in rest:
+            worker.start()
+        threading.Thread(target=self._watch, name="dispatch-health", daemon=True).start()
+
+    def _watch(self):
+        while not self._stopping.wait(HEALTH_INTERVAL):
+            now = time.time()
+            for worker in self.workers:
+                reason = worker.problem(now)
+                if reason is not None and not self._stopping.is_set():
+                    worker.restart(reason)
+
+    def route(self, data, timeout=None):
+        """
+        Отправляет обновление воркеру его отправителя. False — очередь воркера переполнена.
+        """
+        worker = self.workers[shard_of(shard_key_of(data), len(self.workers))]
+        return worker.put(data, timeout)
+
+    def health(self):
+        now = time.time()
+        workers = [worker.status(now) for worker in self.workers]
+        return {
+            "healthy": all(w["alive"] and w["ready"] for w in workers),
+            "routed": sum(w["routed"] for w in workers),
+            "workers": workers,
+        }
+
+    def stop(self):
+        self._stopping.set()
+        for worker in self.workers:
+            worker.stop()
+        deadline = time.monotonic() + STOP_SECONDS
+        for worker in self.workers:
+            worker.process.join(max(0.0, deadline - time.monotonic()))
+            if worker.process.is_alive():
+                logger.warning("Воркер %d не завершился за %d с, останавливаем принудительно", worker.index, STOP_SECONDS)
+                worker.process.kill()
+                worker.process.join()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if self.path.split("?", 1)[0] != self.server.url_path:
+            self.send_error(404)
+            return
+        if WEBHOOK_SECRET_TOKEN and self.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET_TOKEN:
+            self.send_error(403)
+            return
+        try:
+            data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except ValueError:
+            self.send_error(400)
+            return
+        # 503 при переполненной очереди: Telegram повторит доставку позже
+        self._respond(200 if self.server.dispatcher.route(data) else 503)
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/healthz":
+            self.send_error(404)
+            return
+        health = self.server.dispatcher.health()
+        self._respond(200 if health["healthy"] else 503, json.dumps(health).encode("utf-8"))
+
+    def _respond(self, status, body=b""):
+        self.send_response(status)
+        if body:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("webhook: " + format, *args)
+
+
+async def _set_webhook(url):
+    from telegram import Bot, Update
+    certificate = open(WEBHOOK_CERT, "rb") if WEBHOOK_CERT else None
+    try:
+        async with Bot(BOT_TOKEN, base_url=BOT_API_URL) as bot:
+            await bot.set_webhook(
+                url, certificate=certificate, max_connections=WEBHOOK_MAX_CONNECTIONS,
+                secret_token=WEBHOOK_SECRET_TOKEN, allowed_updates=Update.ALL_TYPES,
+            )
+    finally:
+        if certificate is not None:
+            certificate.close()
+
+
+def run_webhook(dispatcher):
+    """
+    HTTP-сервер вебхука в основном потоке; SIGTERM/SIGINT останавливают его.
+    """
+    server = ThreadingHTTPServer((WEBHOOK_LISTEN, WEBHOOK_PORT), _Handler)
+    server.daemon_threads = True
+    server.dispatcher = dispatcher
+    server.url_path = "/" + WEBHOOK_PATH.lstrip("/")
+    if WEBHOOK_CERT and WEBHOOK_KEY:
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(WEBHOOK_CERT, WEBHOOK_KEY)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+    try:
+        asyncio.run(_set_webhook(WEBHOOK_URL))
+    except Exception:
+        # Без связи с Telegram сервер всё равно поднимается: так его можно нагружать записанными обновлениями
+        logger.exception("Не удалось зарегистрировать вебхук %s", WEBHOOK_URL)
+
+    def shutdown(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    logger.info("Диспетчер: вебхук %s:%s%s, воркеров %d", WEBHOOK_LISTEN, WEBHOOK_PORT, server.url_path, len(dispatcher.workers))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+async def _poll(dispatcher):
+    from telegram import Bot, Update
+    from telegram.error import NetworkError
+    async with Bot(BOT_TOKEN, base_url=BOT_API_URL) as bot:
+        await bot.delete_webhook()
+        offset = None
+        try:
+            while True:
+                try:
+                    updates = await bot.get_updates(offset=offset, timeout=POLL_TIMEOUT, allowed_updates=Update.ALL_TYPES)
+                except NetworkError as e:
+                    logger.warning("Ошибка getUpdates: %s", e)
+                    await asyncio.sleep(1)
+                    continue
+                for update in updates:
+                    # Очередь воркера переполнена — ждём, не подтверждая обновление Telegram
+                    while not dispatcher.route(update.to_dict(), timeout=1):
+                        await asyncio.sleep(0)
+                    offset = update.update_id + 1
+        finally:
+            if offset is not None:
+                # Подтверждаем полученные обновления, чтобы после перезапуска они не пришли снова
+                await bot.get_updates(offset=offset, timeout=0)
+
+
+def run_polling(dispatcher):
+    async def run():
+        task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, task.cancel)
+        try:
+            await _poll(dispatcher)
+        except asyncio.CancelledError:
+            pass
+
+    logger.info("Диспетчер: long polling, воркеров %d", len(dispatcher.workers))
+    asyncio.run(run())
+
+
+def main():
+    logging.basicConfig(
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        level=logging.INFO
+    )
+    if USER_STORE != "sqlite":
+        logger.error("Диспетчер работает только с USER_STORE=sqlite: база пользователей общая для воркеров")
+        return 1
+    if BOT_MODE == "webhook" and not WEBHOOK_URL:
+        logger.error("При BOT_MODE=webhook нужен WEBHOOK_URL — внешний https-адрес, который сообщается Telegram")
+        return 1
+    dispatcher = Dispatcher(max(1, DISPATCH_WORKERS))
+    dispatcher.start()
+    try:
+        if BOT_MODE == "webhook":
+            run_webhook(dispatcher)
+        else:
+            run_polling(dispatcher)
+    finally:
+        dispatcher.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
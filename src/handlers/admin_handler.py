@@ -0,0 +1,49 @@
+# src/handlers/admin_handler.py
+import asyncio
+from telegram import Update
+from telegram.ext import ContextTypes, CommandHandler
+from config import ADMIN_IDS, PROFILE_SECONDS
+from utils import profiling
+from utils.concurrency import per_user
+from services.outbound import reply
+
+# Верхняя граница окна, заданного командой, секунды
+MAX_PROFILE_SECONDS = 3600
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /profile [cpu|memory] [секунд] — открыть окно профилирования,
+    /profile stop — закрыть его досрочно. Доступно только ADMIN_IDS.
+    """
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    message = update.message
+    args = context.args or []
+    if args and args[0] == "stop":
+        path = profiling.stop(notify=False)
+        await reply(message, f"Профилирование остановлено, дамп: {path}" if path else "Профилирование не запущено.")
+        return
+
+    mode = args[0] if args else "cpu"
+    if mode not in profiling.MODES:
+        await reply(message, "Использование: /profile [cpu|memory] [секунд] или /profile stop")
+        return
+    try:
+        seconds = int(args[1]) if len(args) > 1 else PROFILE_SECONDS
+    except ValueError:
+        await reply(message, "Длительность указывается в секундах.")
+        return
+    seconds = max(1, min(seconds, MAX_PROFILE_SECONDS))
+
+    loop = asyncio.get_running_loop()
+
+    def notify(path):
+        loop.create_task(reply(message, f"Профилирование завершено, дамп: {path}"))
+
+    if not profiling.start(mode, seconds, notify=notify):
+        await reply(message, f"Профилирование уже идёт ({profiling.active_mode()}), осталось {profiling.remaining_seconds():.0f} с.")
+        return
+    profiling.schedule_stop(context.job_queue)
+    await reply(message, f"Профилирование ({mode}) запущено на {seconds} с.")
+
+profile_handler = CommandHandler("profile", per_user(profile_command))
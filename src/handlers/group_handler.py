@@ -0,0 +1,67 @@
+# src/handlers/group_handler.py
+from telegram import (
+    Update, InlineKeyboardMarkup, InlineKeyboardButton,
+    InlineQueryResultArticle, InputTextMessageContent,
+)
+from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler, InlineQueryHandler
+from utils.user_store import update_profile
+from utils.concurrency import per_user
+from services.outbound import reply, edit_text
+from services.group_index import search_groups
+
+# Сколько групп показывать кнопками в ответ на /group и в inline-режиме
+COMMAND_RESULTS = 8
+INLINE_RESULTS = 20
+# Сколько секунд Telegram может кэшировать ответ на inline-запрос
+INLINE_CACHE_SECONDS = 300
+
+def group_button(course, group):
+    return InlineKeyboardButton(f"{group} ({course} курс)", callback_data=f"pick_group:{course}:{group}")
+
+async def group_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /group <текст> — найти группу по названию и выбрать её одной кнопкой.
+    """
+    text = " ".join(context.args or [])
+    if not text:
+        await reply(update.message, "Использование: /group <название группы>, например /group ИКБ-01")
+        return
+    found = search_groups(text, COMMAND_RESULTS)
+    if not found:
+        await reply(update.message, f"Группы по запросу «{text}» не найдены.")
+        return
+    reply_markup = InlineKeyboardMarkup([[group_button(course, group)] for course, group in found])
+    await reply(update.message, "Выберите группу:", reply_markup=reply_markup)
+
+async def pick_group_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    # Формат: pick_group:{course}:{group}
+    _, course, group = query.data.split(":", 2)
+    update_profile(query.from_user.id, course=course, group=group)
+    await edit_text(
+        query,
+        f"Курс установлен: {course}\nГруппа установлена: {group}\n"
+        "Программу и время оповещений можно выбрать в /settings."
+    )
+
+async def inline_group_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Inline-режим (@бот ИКБ-01): подсказки групп по мере ввода.
+    Выбранная подсказка отправляет команду /group с названием группы.
+    """
+    inline_query = update.inline_query
+    results = [
+        InlineQueryResultArticle(
+            id=str(i),
+            title=group,
+            description=f"{course} курс",
+            input_message_content=InputTextMessageContent(f"/group {group}"),
+        )
+        for i, (course, group) in enumerate(search_groups(inline_query.query, INLINE_RESULTS))
+    ]
+    await inline_query.answer(results, cache_time=INLINE_CACHE_SECONDS)
+
+group_handler = CommandHandler("group", per_user(group_command))
+pick_group_callback_handler = CallbackQueryHandler(per_user(pick_group_callback), pattern="^pick_group:")
+inline_group_handler = InlineQueryHandler(inline_group_search)
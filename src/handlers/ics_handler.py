@@ -0,0 +1,42 @@
+# src/handlers/ics_handler.py
+from telegram import Update, InputFile
+from telegram.ext import ContextTypes, CommandHandler
+from utils.user_store import get_profile
+from utils.concurrency import per_user
+from services.outbound import reply, reply_document
+from services.cache import ensure_course
+from services.ics import get_calendar, cached_file_id, remember_file_id
+
+async def ics_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /ics — расписание группы на семестр файлом для приложения календаря,
+    с учётом программы и языка из настроек.
+    """
+    user_id = update.effective_user.id
+    profile = get_profile(user_id)
+    group, course = profile.group, profile.course
+    if not course:
+        await reply(update.message, "Сначала выберите ваш курс, используя /start.")
+        return
+    if not group:
+        await reply(update.message, "Сначала выберите группу и настройки в /settings.")
+        return
+    schedule_data = await ensure_course(course)
+    if group not in schedule_data:
+        await reply(update.message, f"Группа '{group}' не найдена в расписании для курса {course}.")
+        return
+    digest, payload, start, end = get_calendar(
+        schedule_data, course, group, program=profile.program, language=profile.language
+    )
+    caption = (
+        f"Расписание {group} с {start:%d.%m.%Y} по {end:%d.%m.%Y}.\n"
+        "Откройте файл, чтобы добавить занятия в календарь."
+    )
+    file_id = cached_file_id(digest)
+    document = file_id or InputFile(payload, filename=f"{group}.ics")
+    message = await reply_document(update.message, document, caption=caption)
+    if file_id is None and message is not None and message.document is not None:
+        # Тот же файл в следующий раз отправляется по file_id, без повторной загрузки
+        remember_file_id(digest, message.document.file_id)
+
+ics_handler = CommandHandler("ics", per_user(ics_command))
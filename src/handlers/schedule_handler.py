@@ -2,177 +2,163 @@
 import datetime
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
-from utils.json_db import get_user_group, get_user_course, get_user_program, get_user_language
-from services.cache import get_schedule_for_day, get_schedule_for_week, get_next_week_type, get_current_week_type
-
-DAY_NAMES = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота"]
+from utils.user_store import get_profile
+from utils.concurrency import per_user
+from services.outbound import reply, edit_text
+from services.model import DAY_NAMES
+from services.cache import get_schedule_for_day, get_next_week_type, get_current_week_type, ensure_course, add_reload_listener
+from utils.lru import LRUCache
+from utils import metrics
+from config import RENDER_CACHE_SIZE
 
 async def today_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    group = get_user_group(user_id)
-    course = get_user_course(user_id)
-    program = get_user_program(user_id)
-    language = get_user_language(user_id)
+    profile = get_profile(user_id)
+    group, course = profile.group, profile.course
+    program, language = profile.program, profile.language
     if not course:
-        await update.message.reply_text("Сначала выберите ваш курс, используя /start.")
+        await reply(update.message, "Сначала выберите ваш курс, используя /start.")
         return
     if not group:
-        await update.message.reply_text("Сначала выберите группу и настройки в /settings.")
+        await reply(update.message, "Сначала выберите группу и настройки в /settings.")
         return
     weekday = datetime.datetime.now().weekday()
     if weekday > 5:
-        await update.message.reply_text("Сегодня выходной.")
+        await reply(update.message, "Сегодня выходной.")
         return
+    await ensure_course(course)
     schedule_text = get_schedule_for_day(group, weekday, course, program=program, language=language)
-    await update.message.reply_text(schedule_text)
+    await reply(update.message, schedule_text)
 
 async def tomorrow_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    group = get_user_group(user_id)
-    course = get_user_course(user_id)
-    program = get_user_program(user_id)
-    language = get_user_language(user_id)
+    profile = get_profile(user_id)
+    group, course = profile.group, profile.course
+    program, language = profile.program, profile.language
     if not course:
-        await update.message.reply_text("Сначала выберите ваш курс, используя /start.")
+        await reply(update.message, "Сначала выберите ваш курс, используя /start.")
         return
     if not group:
-        await update.message.reply_text("Сначала выберите группу и настройки в /settings.")
+        await reply(update.message, "Сначала выберите группу и настройки в /settings.")
         return
     weekday = datetime.datetime.now().weekday() + 1
     if weekday > 5:
-        await update.message.reply_text("Завтра выходной.")
+        await reply(update.message, "Завтра выходной.")
         return
+    await ensure_course(course)
     schedule_text = get_schedule_for_day(group, weekday, course, program=program, language=language)
-    await update.message.reply_text(schedule_text)
+    await reply(update.message, schedule_text)
 
-async def week_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.effective_user.id
-    group = get_user_group(user_id)
-    course = get_user_course(user_id)
-    program = get_user_program(user_id)
-    language = get_user_language(user_id)
-    if not course:
-        await update.message.reply_text("Сначала выберите курс, используя /start.")
-        return
-    if not group:
-        await update.message.reply_text("Сначала выберите группу и настройки в /settings.")
-        return
+# Страница недели задаётся в callback_data целиком, без состояния в context.user_data:
+#   wk:{scope}:{week}:{day}:{target}
+# scope — "c" (текущая неделя) или "n" (следующая), week — "u"/"l" (верхняя/нижняя),
+# day — показанный день, target — день, на который ведёт кнопка.
+# Страница target всегда строится по текущему расписанию курса, поэтому
+# кнопки старых сообщений показывают актуальные данные.
+WEEK_SCOPES = {"c": "текущую неделю", "n": "следующую неделю"}
+WEEK_TYPE_CODES = {"upper": "u", "lower": "l"}
+WEEK_TYPES_BY_CODE = {code: week_type for week_type, code in WEEK_TYPE_CODES.items()}
+
+# Готовые страницы: (course, group, program, language, scope, week_type, day) -> (text, markup)
+page_cache = LRUCache(RENDER_CACHE_SIZE)
+
+def _invalidate_pages(course, old_data, new_data, changes):
+    # При перезагрузке курса сбрасываются только страницы изменившихся групп и дней
+    if changes is None:
+        page_cache.invalidate(lambda key: key[0] == course)
+    else:
+        page_cache.invalidate(lambda key: key[0] == course and key[6] in changes.get(key[1], ()))
+
+add_reload_listener(_invalidate_pages)
+metrics.register_cache("week_page", lambda: (page_cache.hits, page_cache.misses))
+
+def _nav_data(scope, week_type, day, target):
+    return f"wk:{scope}:{WEEK_TYPE_CODES[week_type]}:{day}:{target}"
 
-    current_week_type = get_current_week_type()
-    week_label = "Верхняя" if current_week_type == "upper" else "Нижняя"
-    schedule_week = get_schedule_for_week(group, course, program=program, language=language, week_type=current_week_type)
-    
-    context.user_data["week_day_index"] = 0
-    day_index = context.user_data["week_day_index"]
-    day_name = DAY_NAMES[day_index]
+def build_week_page(profile, scope, week_type, day):
+    """
+    Возвращает (text, markup) страницы недели для профиля.
+    Страницы общие для всех пользователей с одинаковыми настройками.
+    """
+    course, group = profile.course, profile.group
+    key = (course, group, profile.program, profile.language, scope, week_type, day)
+    page = page_cache.get(key)
+    if page is not None:
+        return page
+    week_label = "Верхняя" if week_type == "upper" else "Нижняя"
+    day_text = get_schedule_for_day(group, day, course, program=profile.program, language=profile.language, week_type=week_type)
     text = (
-        #f"Текущая неделя: {week_label}\n"
-        f"Расписание для группы {group} (курс {course}) на текущую неделю ({week_label}):\n\n"
-        f"{day_name}:\n{schedule_week.get(day_index, 'На этот день нет занятий.')}"
+        f"Расписание для группы {group} (курс {course}) на {WEEK_SCOPES[scope]} ({week_label}):\n\n"
+        f"{DAY_NAMES[day]}:\n{day_text}"
     )
-    
     keyboard = [
         [
-            InlineKeyboardButton("← Пред.", callback_data="week_prev"),
-            InlineKeyboardButton("След. →", callback_data="week_next")
+            InlineKeyboardButton("← Пред.", callback_data=_nav_data(scope, week_type, day, max(0, day - 1))),
+            InlineKeyboardButton("След. →", callback_data=_nav_data(scope, week_type, day, min(5, day + 1)))
         ]
     ]
-    markup = InlineKeyboardMarkup(keyboard)
-    await update.message.reply_text(text, reply_markup=markup)
-async def nextweek_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    page = (text, InlineKeyboardMarkup(keyboard))
+    page_cache.put(key, page)
+    return page
+
+def parse_nav_data(data):
     """
-    Команда /nextweek показывает расписание, но для следующей недели (с противоположной четностью).
+    Разбирает callback_data кнопок недели в (scope, week_type, day, target).
+    Поддерживает и старый формат week_prev/week_next/nweek_prev/nweek_next:
+    для него считается, что показан понедельник. Шестое поле wk: (версия
+    расписания в кнопках прежних сообщений) не используется.
     """
+    if data.startswith("wk:"):
+        _, scope, week_code, day, target = data.split(":")[:5]
+        return scope, WEEK_TYPES_BY_CODE[week_code], int(day), int(target)
+    prefix, direction = data.split("_")
+    if prefix == "nweek":
+        scope, week_type = "n", get_next_week_type()
+    else:
+        scope, week_type = "c", get_current_week_type()
+    return scope, week_type, 0, 1 if direction == "next" else 0
+
+async def _send_week(update: Update, scope, week_type):
     user_id = update.effective_user.id
-    group = get_user_group(user_id)
-    course = get_user_course(user_id)
-    program = get_user_program(user_id)
-    language = get_user_language(user_id)
-    if not course:
-        await update.message.reply_text("Сначала выберите курс, используя /start.")
+    profile = get_profile(user_id)
+    if not profile.course:
+        await reply(update.message, "Сначала выберите курс, используя /start.")
         return
-    if not group:
-        await update.message.reply_text("Сначала выберите группу и настройки в /settings.")
+    if not profile.group:
+        await reply(update.message, "Сначала выберите группу и настройки в /settings.")
         return
-    next_week_type = get_next_week_type()
-    schedule_week = get_schedule_for_week(group, course, program=program, language=language, week_type=next_week_type)
-    context.user_data["week_day_index"] = 0
-    day_index = context.user_data["week_day_index"]
-    day_name = DAY_NAMES[day_index]
-    week_label = "Верхняя" if next_week_type == "upper" else "Нижняя"
-    text = f"Расписание для группы {group} (курс {course}) на следующую неделю ({week_label}):\n\n{day_name}:\n{schedule_week.get(day_index, 'На этот день нет занятий.')}"
-    keyboard = [
-        [
-            InlineKeyboardButton("← Пред.", callback_data="nweek_prev"),
-            InlineKeyboardButton("След. →", callback_data="nweek_next")
-        ]
-    ]
-    markup = InlineKeyboardMarkup(keyboard)
-    await update.message.reply_text(text, reply_markup=markup)
+    await ensure_course(profile.course)
+    text, markup = build_week_page(profile, scope, week_type, 0)
+    await reply(update.message, text, reply_markup=markup)
+
+async def week_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await _send_week(update, "c", get_current_week_type())
+
+async def nextweek_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Команда /nextweek показывает расписание, но для следующей недели (с противоположной четностью).
+    """
+    await _send_week(update, "n", get_next_week_type())
 
 async def week_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    user_id = query.from_user.id
-    group = get_user_group(user_id)
-    course = get_user_course(user_id)
-    program = get_user_program(user_id)
-    language = get_user_language(user_id)
-    if not course or not group:
-        await query.edit_message_text("Сначала выберите курс и группу в /settings.")
+    scope, week_type, day, target = parse_nav_data(query.data)
+    # «Пред.» в понедельник и «След.» в субботу ничего не меняют — не ходим в API
+    if target == day:
         return
-    schedule_week = get_schedule_for_week(group, course, program=program, language=language)
-    day_index = context.user_data.get("week_day_index", 0)
-    if query.data == "week_prev":
-        day_index = max(0, day_index - 1)
-    elif query.data == "week_next":
-        day_index = min(5, day_index + 1)
-    context.user_data["week_day_index"] = day_index
-    day_name = DAY_NAMES[day_index]
-    text = f"Расписание для группы {group} (курс {course}) на текущую неделю:\n\n{day_name}:\n{schedule_week.get(day_index, 'На этот день нет занятий.')}"
-    keyboard = [
-        [
-            InlineKeyboardButton("← Пред.", callback_data="week_prev"),
-            InlineKeyboardButton("След. →", callback_data="week_next")
-        ]
-    ]
-    markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(text, reply_markup=markup)
-
-async def nextweek_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-    user_id = query.from_user.id
-    group = get_user_group(user_id)
-    course = get_user_course(user_id)
-    program = get_user_program(user_id)
-    language = get_user_language(user_id)
-    if not course or not group:
-        await query.edit_message_text("Сначала выберите курс и группу в /settings.")
+    profile = get_profile(query.from_user.id)
+    if not profile.course or not profile.group:
+        await edit_text(query, "Сначала выберите курс и группу в /settings.")
         return
-    next_week_type = get_next_week_type()
-    schedule_week = get_schedule_for_week(group, course, program=program, language=language, week_type=next_week_type)
-    day_index = context.user_data.get("week_day_index", 0)
-    if query.data == "nweek_prev":
-        day_index = max(0, day_index - 1)
-    elif query.data == "nweek_next":
-        day_index = min(5, day_index + 1)
-    context.user_data["week_day_index"] = day_index
-    day_name = DAY_NAMES[day_index]
-    week_label = "Верхняя" if next_week_type == "upper" else "Нижняя"
-    text = f"Расписание для группы {group} (курс {course}) на следующую неделю ({week_label}):\n\n{day_name}:\n{schedule_week.get(day_index, 'На этот день нет занятий.')}"
-    keyboard = [
-        [
-            InlineKeyboardButton("← Пред.", callback_data="nweek_prev"),
-            InlineKeyboardButton("След. →", callback_data="nweek_next")
-        ]
-    ]
-    markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(text, reply_markup=markup)
+    await ensure_course(profile.course)
+    text, markup = build_week_page(profile, scope, week_type, target)
+    await edit_text(query, text, reply_markup=markup)
 
-today_handler = CommandHandler("today", today_command)
-tomorrow_handler = CommandHandler("tomorrow", tomorrow_command)
-week_handler = CommandHandler("week", week_command)
-nextweek_handler = CommandHandler("nextweek", nextweek_command)
-week_callback_handler = CallbackQueryHandler(week_callback, pattern="^week_(prev|next)$")
-nextweek_callback_handler = CallbackQueryHandler(nextweek_callback, pattern="^nweek_(prev|next)$")
+today_handler = CommandHandler("today", per_user(today_command))
+tomorrow_handler = CommandHandler("tomorrow", per_user(tomorrow_command))
+week_handler = CommandHandler("week", per_user(week_command))
+nextweek_handler = CommandHandler("nextweek", per_user(nextweek_command))
+week_callback_handler = CallbackQueryHandler(per_user(week_callback), pattern="^(wk:|week_(prev|next)$)")
+# Кнопки /nextweek из сообщений, отправленных до перехода на формат wk:
+nextweek_callback_handler = CallbackQueryHandler(per_user(week_callback), pattern="^nweek_(prev|next)$")
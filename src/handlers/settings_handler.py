@@ -1,90 +1,119 @@
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
-from utils.json_db import (
-    set_user_group,
-    set_user_notification_time,
-    set_user_program,
-    set_user_language,
-    get_user_group,
-    get_user_program,
-    get_user_notification_time,
-    get_user_course,
-    set_user_course
-)
-from services.cache import get_all_groups, get_available_languages
+from utils.user_store import get_profile, update_profile
+from utils.concurrency import per_user
+from services.outbound import reply, edit_text, edit_markup
+from services.notification import sync_profile
+from services.cache import get_all_groups, get_available_languages, ensure_course, add_reload_listener
+from services.diff import groups_changed
+from utils.lru import LRUCache
+from utils import metrics
 import math
 
 PROGRAM_OPTIONS = ["ФГОС", "МП"]
 NOTIFICATION_TIMES = ["07:00", "08:00", "09:00", "10:00", "20:00"]
+COURSE_OPTIONS = ["1", "2", "3", "4", "5", "6"]
 GROUPS_PER_PAGE = 6  # Количество групп на странице
+SETTINGS_TEXT = "Настройки:\nВыберите курс, группу, время оповещений и программу (ФГОС/МП):"
 
-def generate_group_keyboard(groups, current_page=0, current_group=None):
+# Статичная часть клавиатуры настроек: (course, page) -> строки слотов.
+# Слот — (kind, value, button, marked_button); kind=None у кнопок без отметки.
+_layout_cache = LRUCache(256)
+
+def _invalidate_layouts(course, old_data, new_data, changes):
+    # Раскладка зависит только от списка групп курса
+    if groups_changed(old_data, new_data):
+        _layout_cache.invalidate(lambda key: key[0] == course)
+
+add_reload_listener(_invalidate_layouts)
+metrics.register_cache("settings_layout", lambda: (_layout_cache.hits, _layout_cache.misses))
+
+def _slot(kind, value, callback_data):
+    return (
+        kind,
+        value,
+        InlineKeyboardButton(value, callback_data=callback_data),
+        InlineKeyboardButton("✅ " + value, callback_data=callback_data),
+    )
+
+def _static_slot(text, callback_data):
+    button = InlineKeyboardButton(text, callback_data=callback_data)
+    return (None, None, button, button)
+
+def _group_rows(groups, current_page):
     total_pages = math.ceil(len(groups) / GROUPS_PER_PAGE)
     start_index = current_page * GROUPS_PER_PAGE
-    end_index = start_index + GROUPS_PER_PAGE
-    page_groups = groups[start_index:end_index]
-    
-    keyboard = []
-    row = []
-    for group in page_groups:
-        button_text = f"✅ {group}" if group == current_group else group
-        row.append(InlineKeyboardButton(button_text, callback_data=f"set_group:{group}:{current_page}"))
-        if len(row) == 2:
-            keyboard.append(row)
-            row = []
-    if row:
-        keyboard.append(row)
-    
+    page_groups = groups[start_index:start_index + GROUPS_PER_PAGE]
+    rows = [
+        tuple(_slot("group", group, f"set_group:{group}:{current_page}") for group in page_groups[i:i + 2])
+        for i in range(0, len(page_groups), 2)
+    ]
     nav_buttons = []
     if current_page > 0:
-        nav_buttons.append(InlineKeyboardButton("← Предыдущая", callback_data=f"group_page:{current_page-1}"))
+        nav_buttons.append(_static_slot("← Предыдущая", f"group_page:{current_page-1}"))
     if current_page < total_pages - 1:
-        nav_buttons.append(InlineKeyboardButton("Следующая →", callback_data=f"group_page:{current_page+1}"))
+        nav_buttons.append(_static_slot("Следующая →", f"group_page:{current_page+1}"))
     if nav_buttons:
-        keyboard.append(nav_buttons)
-    
-    return InlineKeyboardMarkup(keyboard)
+        rows.append(tuple(nav_buttons))
+    return rows
+
+def _apply_marks(rows, selected):
+    return InlineKeyboardMarkup(tuple(
+        tuple(marked if kind is not None and selected.get(kind) == value else button
+              for kind, value, button, marked in row)
+        for row in rows
+    ))
+
+def generate_group_keyboard(groups, current_page=0, current_group=None):
+    return _apply_marks(_group_rows(groups, current_page), {"group": current_group})
+
+def _settings_layout(course, page):
+    """
+    Возвращает статичную раскладку клавиатуры настроек для курса и страницы групп.
+    Раскладка строится один раз и живёт, пока не изменится список групп курса.
+    """
+    key = (course, page)
+    layout = _layout_cache.get(key)
+    if layout is None:
+        groups = get_all_groups(course) if course else []
+        layout = (
+            (_static_slot("Выберите курс:", "ignore"),),
+            tuple(_slot("course", c, f"set_course:{c}") for c in COURSE_OPTIONS),
+            (_static_slot("Выберите группу:", "ignore"),),
+            *_group_rows(groups, page),
+            tuple(_slot("time", t, f"set_time:{t}") for t in NOTIFICATION_TIMES),
+            tuple(_slot("program", p, f"set_program:{p}") for p in PROGRAM_OPTIONS),
+        )
+        _layout_cache.put(key, layout)
+    return layout
+
+async def build_settings_markup(profile, page=0):
+    """
+    Клавиатура настроек для профиля: кэшированная раскладка плюс отметки ✅
+    у выбранных курса, группы, времени и программы.
+    """
+    if profile.course:
+        await ensure_course(profile.course)
+    selected = {
+        "course": profile.course,
+        "group": profile.group,
+        "time": profile.notification_time,
+        "program": profile.program,
+    }
+    return _apply_marks(_settings_layout(profile.course, page), selected)
+
+def _unchanged(query, text, reply_markup):
+    # Telegram отвечает ошибкой «message is not modified» — не отправляем такие правки вовсе
+    message = query.message
+    if message is None:
+        return False
+    return (text is None or message.text == text) and message.reply_markup == reply_markup
 
 async def settings_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    current_course = get_user_course(user_id)
-    current_group = get_user_group(user_id)
-    current_program = get_user_program(user_id)
-    current_time = get_user_notification_time(user_id)
-    
-    # Строка для выбора курса (1-6)
-    course_buttons = [
-        InlineKeyboardButton(text=("✅ " + c) if current_course == c else c, callback_data=f"set_course:{c}")
-        for c in ["1", "2", "3", "4", "5", "6"]
-    ]
-    
-    # Получаем список групп из расписания для выбранного курса, если установлен
-    groups = get_all_groups(current_course) if current_course else []
-    group_keyboard = generate_group_keyboard(groups, current_page=0, current_group=current_group)
-    
-    time_buttons = [
-        InlineKeyboardButton(text=("✅ " + t) if current_time == t else t, callback_data=f"set_time:{t}")
-        for t in NOTIFICATION_TIMES
-    ]
-    program_buttons = [
-        InlineKeyboardButton(text=("✅ " + p) if current_program == p else p, callback_data=f"set_program:{p}")
-        for p in PROGRAM_OPTIONS
-    ]
-    
-    keyboard = [
-        [InlineKeyboardButton("Выберите курс:", callback_data="ignore")],
-        course_buttons,
-        [InlineKeyboardButton("Выберите группу:", callback_data="ignore")],
-        *group_keyboard.inline_keyboard,
-        time_buttons,
-        program_buttons,
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    await update.message.reply_text(
-        "Настройки:\nВыберите курс, группу, время оповещений и программу (ФГОС/МП):",
-        reply_markup=reply_markup
-    )
+    profile = get_profile(user_id)
+    reply_markup = await build_settings_markup(profile)
+    await reply(update.message, SETTINGS_TEXT, reply_markup=reply_markup)
 
 async def settings_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -93,106 +122,67 @@ async def settings_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     action = data[0]
     value = data[1]
     response = ""
+    user_id = query.from_user.id
+    # Профиль читается один раз; все изменения применяются одним update_profile
+    profile = get_profile(user_id)
+    changes = {}
     
     if action == "set_group":
         # Формат: set_group:{group}:{page}
         parts = query.data.split(":")
         group = parts[1]
-        set_user_group(query.from_user.id, group)
+        changes["group"] = group
         response = f"Группа установлена: {group}"
     elif action == "group_page":
-        new_page = int(value)
-        current_course = get_user_course(query.from_user.id)
-        groups = get_all_groups(current_course) if current_course else []
-        current_group = get_user_group(query.from_user.id)
-        group_keyboard = generate_group_keyboard(groups, current_page=new_page, current_group=current_group)
-        current_program = get_user_program(query.from_user.id)
-        current_time = get_user_notification_time(query.from_user.id)
-        program_buttons = [
-            InlineKeyboardButton(text=("✅ " + p) if current_program == p else p, callback_data=f"set_program:{p}")
-            for p in PROGRAM_OPTIONS
-        ]
-        time_buttons = [
-            InlineKeyboardButton(text=("✅ " + t) if current_time == t else t, callback_data=f"set_time:{t}")
-            for t in NOTIFICATION_TIMES
-        ]
-        course_buttons = [
-            InlineKeyboardButton(text=("✅ " + c) if get_user_course(query.from_user.id) == c else c, callback_data=f"set_course:{c}")
-            for c in ["1", "2", "3", "4", "5", "6"]
-        ]
-        keyboard = [
-            [InlineKeyboardButton("Выберите курс:", callback_data="ignore")],
-            course_buttons,
-            [InlineKeyboardButton("Выберите группу:", callback_data="ignore")],
-            *group_keyboard.inline_keyboard,
-            time_buttons,
-            program_buttons,
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_reply_markup(reply_markup=reply_markup)
+        reply_markup = await build_settings_markup(profile, page=int(value))
+        if not _unchanged(query, None, reply_markup):
+            await edit_markup(query, reply_markup=reply_markup)
         return
     elif action == "set_time":
-        set_user_notification_time(query.from_user.id, value)
+        changes["notification_time"] = value
         response = f"Время оповещений установлено: {value}"
     elif action == "set_program":
-        set_user_program(query.from_user.id, value)
+        changes["program"] = value
         response = f"Программа установлена: {value}"
-        group = get_user_group(query.from_user.id)
-        current_course = get_user_course(query.from_user.id)
-        if group:
+        group = profile.group
+        current_course = profile.course
+        if group and current_course:
+            await ensure_course(current_course)
             langs = get_available_languages(group, current_course, program=value)
             if langs:
                 if len(langs) == 1:
-                    set_user_language(query.from_user.id, langs[0])
+                    changes["language"] = langs[0]
                     response += f"\nЯзык установлен автоматически: {langs[0]}"
                 else:
+                    update_profile(user_id, **changes)
                     lang_buttons = [InlineKeyboardButton(text=lang, callback_data=f"set_language:{lang}") for lang in langs]
                     reply_markup = InlineKeyboardMarkup([[btn] for btn in lang_buttons])
                     response += "\nВыберите язык:"
-                    await query.edit_message_text(response, reply_markup=reply_markup)
+                    await edit_text(query, response, reply_markup=reply_markup)
                     return
             else:
                 response += "\nДоступных вариантов языка не найдено."
     elif action == "set_language":
-        set_user_language(query.from_user.id, value)
+        changes["language"] = value
         response = f"Язык установлен: {value}"
     elif action == "set_course":
         # Обработчик для выбора курса в настройках
-        set_user_course(query.from_user.id, value)
+        changes["course"] = value
         response = f"Курс установлен: {value}"
     
+    if changes:
+        profile = update_profile(user_id, **changes)
+        if "notification_time" in changes:
+            sync_profile(profile)
+    
     # Перестраиваем клавиатуру с обновленными настройками
-    user_id = query.from_user.id
-    current_course = get_user_course(user_id)
-    course_buttons = [
-        InlineKeyboardButton(text=("✅ " + c) if current_course == c else c, callback_data=f"set_course:{c}")
-        for c in ["1", "2", "3", "4", "5", "6"]
-    ]
-    groups = get_all_groups(current_course) if current_course else []
-    group_keyboard = generate_group_keyboard(groups, current_page=0, current_group=get_user_group(user_id))
-    current_program = get_user_program(user_id)
-    current_time = get_user_notification_time(user_id)
-    time_buttons = [
-        InlineKeyboardButton(text=("✅ " + t) if current_time == t else t, callback_data=f"set_time:{t}")
-        for t in NOTIFICATION_TIMES
-    ]
-    program_buttons = [
-        InlineKeyboardButton(text=("✅ " + p) if current_program == p else p, callback_data=f"set_program:{p}")
-        for p in PROGRAM_OPTIONS
-    ]
-    keyboard = [
-        [InlineKeyboardButton("Выберите курс:", callback_data="ignore")],
-        course_buttons,
-        [InlineKeyboardButton("Выберите группу:", callback_data="ignore")],
-        *group_keyboard.inline_keyboard,
-        time_buttons,
-        program_buttons,
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await query.edit_message_text(response, reply_markup=reply_markup)
+    reply_markup = await build_settings_markup(profile)
+    if _unchanged(query, response, reply_markup):
+        return
+    await edit_text(query, response, reply_markup=reply_markup)
 
-settings_handler = CommandHandler("settings", settings_command)
+settings_handler = CommandHandler("settings", per_user(settings_command))
 settings_callback_handler = CallbackQueryHandler(
-    settings_callback,
+    per_user(settings_callback),
     pattern="^(set_group|group_page|set_time|set_program|set_language|set_course):"
 )
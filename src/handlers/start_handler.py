@@ -1,13 +1,16 @@
 # src/handlers/start_handler.py
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, CommandHandler, CallbackQueryHandler
-from utils.json_db import add_user_if_not_exists, get_user_course, get_user_group, set_user_course
+from utils.user_store import update_profile
+from utils.concurrency import per_user
+from services.outbound import reply, edit_text
 from handlers.settings_handler import settings_command
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    add_user_if_not_exists(user_id)
-    course = get_user_course(user_id)
+    # Создаёт пользователя, если его ещё нет, и сразу возвращает профиль
+    profile = update_profile(user_id)
+    course = profile.course
     if course is None:
         # Если курс не выбран, предлагаем выбрать курс (1-6)
         keyboard = [
@@ -23,14 +26,14 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             ]
         ]
         reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_text("Пожалуйста, выберите ваш курс (1–6):", reply_markup=reply_markup)
+        await reply(update.message, "Пожалуйста, выберите ваш курс (1–6):", reply_markup=reply_markup)
     else:
         # Если курс выбран, но группа ещё не установлена, предлагаем настройки
-        group = get_user_group(user_id)
+        group = profile.group
         if group is None:
             await settings_command(update, context)
         else:
-            await update.message.reply_text("Привет! Используйте команды /today, /tomorrow, /week для получения расписания.")
+            await reply(update.message, "Привет! Используйте команды /today, /tomorrow, /week для получения расписания.")
 
 async def course_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
@@ -38,10 +41,10 @@ async def course_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     data = query.data.split(":")
     if data[0] == "set_course":
         course = data[1]
-        set_user_course(query.from_user.id, course)
-        await query.edit_message_text(f"Курс установлен: {course}\nТеперь перейдите в /settings для выбора группы и остальных настроек.")
+        update_profile(query.from_user.id, course=course)
+        await edit_text(query, f"Курс установлен: {course}\nТеперь перейдите в /settings для выбора группы и остальных настроек.")
 
-start_handler = CommandHandler("start", start_command)
-course_callback_handler = CallbackQueryHandler(course_callback, pattern="^set_course:")
+start_handler = CommandHandler("start", per_user(start_command))
+course_callback_handler = CallbackQueryHandler(per_user(course_callback), pattern="^set_course:")
 
 # Экспортируйте оба хендлера для регистрации в bot.py
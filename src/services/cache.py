@@ -1,36 +1,320 @@
 import os
-from services.parser import parse_schedule
+import re
+import time
+import asyncio
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from services.snapshot import load_or_parse
+from services.diff import diff_schedules
+from services.store import ScheduleStore, publish_store, store_stat
 import datetime
-from config import CURRENT_WEEK_PARITY  # например, "even" или "odd"
+from config import CURRENT_WEEK_PARITY, PARSE_WORKERS, RENDER_CACHE_SIZE, SCHEDULE_STORE  # CURRENT_WEEK_PARITY: "even" или "odd"
+from utils.lru import LRUCache
+from utils import metrics, profiling
+from services.model import FLAG_GREEN_LANGUAGE, program_code
+
+logger = logging.getLogger(__name__)
+
+COURSES = ["1", "2", "3", "4", "5", "6"]
+
+LANGUAGE_RE = re.compile(r"(.+?)\s*язык", re.IGNORECASE)
 
 schedule_cache = {}
+# Версия расписания курса: увеличивается при каждой замене данных в schedule_cache
+schedule_versions = {}
+# (size, mtime_ns) файла xlsx, из которого загружена текущая версия курса
+source_stats = {}
+# Функции вида listener(course, old_data, new_data, changes), вызываемые после замены расписания.
+# changes — {group: frozenset(days)} из diff_schedules или None, если изменилось всё (первая загрузка).
+_reload_listeners = []
+# Пул процессов для разбора xlsx и задачи загрузки, которые сейчас выполняются (курс -> Task)
+_process_pool = None
+_inflight = {}
+# Готовые тексты дней: (course, group, program, language, week_type, day) -> str
+render_cache = LRUCache(RENDER_CACHE_SIZE)
+# Текущая отображённая версия общего хранилища (SCHEDULE_STORE) или None
+_store = None
+# Публикации хранилища после перезагрузок курсов: по одной за раз, ссылки на задачи
+_publish_lock = asyncio.Lock()
+_publish_tasks = set()
+# Попадания и промахи ensure_course для метрик
+_course_hits = 0
+_course_misses = 0
+
+def course_file_path(course) -> str:
+    return os.path.join("data", f"schedule{course}.xlsx")
+
+def read_source_stat(course):
+    """
+    Возвращает (size, mtime_ns) файла расписания курса или None, если файла нет.
+    """
+    try:
+        st = os.stat(course_file_path(course))
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+def add_reload_listener(listener):
+    _reload_listeners.append(listener)
+
+def set_course_schedule(course, schedule_data, stat=None):
+    """
+    Атомарно подменяет расписание курса: новый словарь полностью собран заранее,
+    а присваивание ссылки в schedule_cache не может быть видно наполовину.
+    Обработчики, уже получившие старый словарь, дорабатывают с ним.
+    Слушателям передаётся разница версий, чтобы сбрасывать только изменившееся.
+    """
+    course = str(course)
+    old_data = schedule_cache.get(course)
+    changes = diff_schedules(old_data, schedule_data)
+    schedule_cache[course] = schedule_data
+    schedule_versions[course] = schedule_versions.get(course, 0) + 1
+    if stat is not None:
+        source_stats[course] = stat
+    for listener in _reload_listeners:
+        try:
+            listener(course, old_data, schedule_data, changes)
+        except Exception:
+            logger.exception("Ошибка в обработчике перезагрузки курса %s", course)
+
+def _invalidate_renders(course, old_data, new_data, changes):
+    # Ключ: (course, group, program, language, week_type, day)
+    if changes is None:
+        removed = render_cache.invalidate(lambda key: key[0] == course)
+    else:
+        removed = render_cache.invalidate(
+            lambda key: key[0] == course and key[5] in changes.get(key[1], ())
+        )
+    logger.debug("Кэш отрисовки курса %s: сброшено %d записей", course, removed)
+
+add_reload_listener(_invalidate_renders)
+metrics.register_cache("render", lambda: (render_cache.hits, render_cache.misses))
+metrics.register_cache("schedule", lambda: (_course_hits, _course_misses))
+
+def _observe_load(course, started, from_snapshot):
+    metrics.schedule_load_seconds.observe(
+        time.perf_counter() - started, course, "snapshot" if from_snapshot else "xlsx"
+    )
+
+def _swap_to_store(courses, size, started):
+    """
+    Переключает schedule_cache на только что опубликованную версию хранилища.
+    Курсы, которые успели перезагрузиться после снимка courses, не трогаются:
+    их новые данные попадут в следующую публикацию.
+    """
+    global _store
+    _store = ScheduleStore()
+    for course in _store.courses():
+        if schedule_cache.get(course) is courses.get(course):
+            schedule_cache[course] = _store.course(course)
+    logger.info(
+        "Хранилище расписаний опубликовано: %d курсов, %.1f КБ за %.1f мс",
+        len(courses), size / 1024, (time.perf_counter() - started) * 1000
+    )
+
+def publish_schedules():
+    """
+    При SCHEDULE_STORE=publish записывает все загруженные курсы в общее хранилище
+    и переключает schedule_cache на отображённую версию: разобранные словари
+    освобождаются, а чтение идёт из файла, общего со всеми воркерами.
+    Данные не меняются, поэтому слушатели перезагрузки не вызываются.
+    Ошибка публикации только пишется в лог: бот продолжает работать с разобранными данными.
+    """
+    if SCHEDULE_STORE != "publish" or not schedule_cache:
+        return
+    started = time.perf_counter()
+    courses = dict(schedule_cache)
+    try:
+        size = publish_store(courses)
+        _swap_to_store(courses, size, started)
+    except Exception:
+        logger.exception("Не удалось опубликовать хранилище расписаний")
+
+async def _publish_in_background():
+    """
+    То же, что publish_schedules, но сборка и запись файла идут в потоке,
+    а не в цикле событий. Публикации выполняются по очереди, снимок
+    schedule_cache берётся уже под блокировкой, поэтому последней
+    записывается самая свежая версия.
+    """
+    async with _publish_lock:
+        if not schedule_cache:
+            return
+        started = time.perf_counter()
+        courses = dict(schedule_cache)
+        try:
+            size = await asyncio.get_running_loop().run_in_executor(None, publish_store, courses)
+            _swap_to_store(courses, size, started)
+        except Exception:
+            logger.exception("Не удалось опубликовать хранилище расписаний")
+
+def store_changed():
+    """
+    True, если при SCHEDULE_STORE=map опубликована версия хранилища новее отображённой.
+    """
+    if SCHEDULE_STORE != "map":
+        return False
+    stat = store_stat()
+    return stat is not None and (_store is None or stat != _store.stat)
+
+def attach_store():
+    """
+    Отображает текущую версию общего хранилища и подменяет ею расписания курсов.
+    Слушатели получают разницу версий, как при перезагрузке xlsx.
+    Возвращает False, если хранилище ещё не опубликовано или не читается.
+    """
+    global _store
+    try:
+        store = ScheduleStore()
+    except FileNotFoundError:
+        return False
+    except Exception:
+        logger.exception("Не удалось открыть хранилище расписаний")
+        return False
+    _store = store
+    for course in store.courses():
+        set_course_schedule(course, store.course(course))
+    logger.info("Подключена версия хранилища расписаний: курсы %s", ", ".join(store.courses()))
+    return True
 
 def init_cache_for_course(course):
     """
-    Парсит файл schedule{course}.xlsx из папки data и сохраняет результат в кэше.
+    Загружает расписание курса из снимка или, если schedule{course}.xlsx изменился,
+    парсит файл заново. Результат сохраняется в кэше.
+    Возвращает True, если данные взяты из снимка.
     """
     course_str = str(course)
-    file_path = os.path.join("data", f"schedule{course_str}.xlsx")
-    schedule_cache[course_str] = parse_schedule(file_path)
+    started = time.perf_counter()
+    stat = read_source_stat(course_str)
+    schedule_data, from_snapshot = load_or_parse(course_file_path(course_str))
+    _observe_load(course_str, started, from_snapshot)
+    set_course_schedule(course_str, schedule_data, stat)
+    return from_snapshot
 
 def init_cache():
     """
-    Инициализирует кэш для курса "1" по умолчанию.
+    Прогревает кэш для всех курсов, для которых есть файл расписания.
+    Пишет в лог время загрузки каждого курса и общее время старта.
     """
-    init_cache_for_course("1")
+    if SCHEDULE_STORE == "map":
+        if attach_store():
+            return
+        logger.warning("Хранилище расписаний ещё не опубликовано, разбираем xlsx сами")
+    total_start = time.perf_counter()
+    warm, cold = 0, 0
+    for course in COURSES:
+        if not os.path.exists(course_file_path(course)):
+            logger.warning("Файл расписания для курса %s не найден, пропускаем", course)
+            continue
+        start = time.perf_counter()
+        from_snapshot = init_cache_for_course(course)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if from_snapshot:
+            warm += 1
+        else:
+            cold += 1
+        logger.info("Курс %s: %s за %.1f мс", course, "снимок" if from_snapshot else "разбор xlsx", elapsed_ms)
+    logger.info(
+        "Кэш расписаний готов за %.1f мс (из снимков: %d, разобрано заново: %d)",
+        (time.perf_counter() - total_start) * 1000, warm, cold
+    )
+    publish_schedules()
 
-def get_current_week_type():
+def _get_process_pool():
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+    return _process_pool
+
+def shutdown_process_pool():
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(cancel_futures=True)
+        _process_pool = None
+
+def _load_course_data(course, profile_mode=None):
     """
-    Вычисляет текущую неделю.
+    Выполняется в процессе пула: читает снимок или разбирает xlsx курса.
+    При открытом окне профилирования (profile_mode) пишет отдельный дамп загрузки.
+    Возвращает (stat, schedule_data, from_snapshot).
+    """
+    with profiling.capture(f"parse-{course}", profile_mode):
+        stat = read_source_stat(course)
+        schedule_data, from_snapshot = load_or_parse(course_file_path(course))
+    return stat, schedule_data, from_snapshot
+
+async def _load_in_pool(course):
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    stat, schedule_data, from_snapshot = await loop.run_in_executor(
+        _get_process_pool(), _load_course_data, course, profiling.active_mode()
+    )
+    _observe_load(course, started, from_snapshot)
+    set_course_schedule(course, schedule_data, stat)
+    if SCHEDULE_STORE == "publish":
+        # Новое расписание уже в schedule_cache; публикация не задерживает ответ
+        task = loop.create_task(_publish_in_background())
+        _publish_tasks.add(task)
+        task.add_done_callback(_publish_tasks.discard)
+    return schedule_data
+
+async def load_course(course):
+    """
+    Загружает курс в пуле процессов, не блокируя цикл событий.
+    Одновременные вызовы для одного курса ждут одну и ту же задачу,
+    поэтому файл разбирается один раз. Ошибки разбора пробрасываются всем ожидающим.
+    """
+    course = str(course)
+    task = _inflight.get(course)
+    if task is None:
+        task = asyncio.get_running_loop().create_task(_load_in_pool(course))
+        _inflight[course] = task
+        task.add_done_callback(lambda _: _inflight.pop(course, None))
+    # shield: отмена одного обработчика не должна прерывать общую загрузку
+    return await asyncio.shield(task)
+
+async def ensure_course(course):
+    """
+    Гарантирует, что расписание курса есть в кэше. Обработчики вызывают её
+    перед синхронными функциями get_*, чтобы промах кэша не блокировал цикл событий.
+    """
+    global _course_hits, _course_misses
+    course = str(course)
+    schedule_data = schedule_cache.get(course)
+    if schedule_data is not None:
+        _course_hits += 1
+        return schedule_data
+    _course_misses += 1
+    return await load_course(course)
+
+def _course_data(course):
+    """
+    Синхронный доступ к расписанию курса. При промахе кэша курс загружается
+    прямо в вызывающем потоке, поэтому в обработчиках сначала вызывается ensure_course.
+    """
+    course = str(course)
+    if course not in schedule_cache:
+        init_cache_for_course(course)
+    return schedule_cache.get(course)
+
+def get_week_type(date: datetime.date):
+    """
+    Вычисляет тип недели для указанной даты.
     Если CURRENT_WEEK_PARITY == "even": чётные недели – верхние, нечётные – нижние.
     Если "odd": наоборот.
     """
-    week_num = datetime.date.today().isocalendar()[1]
+    week_num = date.isocalendar()[1]
     if CURRENT_WEEK_PARITY.lower() == "even":
         return "upper" if week_num % 2 == 0 else "lower"
     else:
         return "upper" if week_num % 2 == 1 else "lower"
 
+def get_current_week_type():
+    """
+    Вычисляет текущую неделю.
+    """
+    return get_week_type(datetime.date.today())
+
 def get_next_week_type():
     """
     Возвращает тип следующей недели, инвертируя текущий.
@@ -54,13 +338,61 @@ def get_all_groups(course=None):
     """
     if course is None:
         course = "1"
-    else:
-        course = str(course)
-    if course not in schedule_cache:
-        init_cache_for_course(course)
-    schedule_data = schedule_cache.get(course)
+    schedule_data = _course_data(course)
     return list(schedule_data.keys()) if schedule_data else []
 
+def filter_lessons(lessons, program, language, week_type):
+    """
+    Для каждого урока, в котором пользователю с программой и языком что-то видно,
+    выдаёт (lesson, тексты записей для week_type).
+    Фильтр работает по кодам и флагам записей, без поиска по словарям.
+    """
+    program = program_code(program)
+    language = language.lower() if language else None
+    upper = week_type == "upper"
+    for lesson in lessons:
+        filtered_entries = []
+        for entry in lesson.entries:
+            if program and entry.program and entry.program != program:
+                continue
+            if entry.flags & FLAG_GREEN_LANGUAGE == FLAG_GREEN_LANGUAGE:
+                if not language or language not in entry.search_text:
+                    continue
+            filtered_entries.append(entry.upper if upper else entry.lower)
+        if filtered_entries:
+            yield lesson, filtered_entries
+
+def _render_day(lessons, program, language, week_type) -> str:
+    """
+    Собирает текст расписания одного дня с фильтрацией по программе и языку.
+    """
+    output_lines = [
+        f"{lesson.number}. {lesson.time.replace('.', ':')}: " + "; ".join(filtered_entries)
+        for lesson, filtered_entries in filter_lessons(lessons, program, language, week_type)
+    ]
+    return "\n".join(output_lines) if output_lines else "На этот день нет занятий."
+
+def _cached_day(schedule_data, course, group, day, program, language, week_type) -> str:
+    """
+    Возвращает текст дня из render_cache или отрисовывает его и кладёт в кэш.
+    Группа должна присутствовать в schedule_data.
+    """
+    key = (course, group, program, language, week_type, day)
+    text = render_cache.get(key)
+    if text is None:
+        text = _render_day(schedule_data[group].get(day, []), program, language, week_type)
+        render_cache.put(key, text)
+    return text
+
+def render_version_day(schedule_data, group, day, program=None, language=None, week_type="upper") -> str:
+    """
+    Отрисовывает день группы по заданной версии расписания курса, минуя render_cache.
+    Нужна для сравнения старой и новой версии при перезагрузке.
+    """
+    if schedule_data is None or group not in schedule_data:
+        return _render_day((), program, language, week_type)
+    return _render_day(schedule_data[group].get(day, ()), program, language, week_type)
+
 def get_schedule_for_day(group: str, day: int, course, program: str = None, language: str = None, week_type: str = None) -> str:
     """
     Возвращает расписание на заданный день для указанной группы и курса.
@@ -70,32 +402,10 @@ def get_schedule_for_day(group: str, day: int, course, program: str = None, lang
     if week_type is None:
         week_type = get_current_week_type()
     course = str(course)
-    if course not in schedule_cache:
-        init_cache_for_course(course)
-    schedule_data = schedule_cache.get(course)
+    schedule_data = _course_data(course)
     if group not in schedule_data:
         return f"Группа '{group}' не найдена в расписании для курса {course}."
-    lessons = schedule_data[group].get(day, [])
-    if not lessons:
-        return "На этот день нет занятий."
-    output_lines = []
-    for lesson in lessons:
-        filtered_entries = []
-        for entry in lesson.get("entries", []):
-            if program and entry.get("program") and entry["program"] != program:
-                continue
-            if entry.get("cell_color") == "green" and entry.get("is_language"):
-                if language:
-                    if language.lower() not in entry["text"].lower():
-                        continue
-                else:
-                    continue
-            processed_text = process_entry_by_week(entry["text"], week_type)
-            filtered_entries.append(processed_text)
-        if filtered_entries:
-            time_text = lesson["time"].replace('.', ':')
-            output_lines.append(f"{lesson.get('number')}. {time_text}: " + "; ".join(filtered_entries))
-    return "\n".join(output_lines) if output_lines else "На этот день нет занятий."
+    return _cached_day(schedule_data, course, group, day, program, language, week_type)
 
 def get_schedule_for_week(group: str, course, program: str = None, language: str = None, week_type: str = None) -> dict:
     """
@@ -105,33 +415,13 @@ def get_schedule_for_week(group: str, course, program: str = None, language: str
     if week_type is None:
         week_type = get_current_week_type()
     course = str(course)
-    if course not in schedule_cache:
-        init_cache_for_course(course)
-    schedule_data = schedule_cache.get(course)
-    result = {}
+    schedule_data = _course_data(course)
     if group not in schedule_data:
-        return result
-    for day in range(6):
-        lessons = schedule_data[group].get(day, [])
-        output_lines = []
-        for lesson in lessons:
-            filtered_entries = []
-            for entry in lesson.get("entries", []):
-                if program and entry.get("program") and entry["program"] != program:
-                    continue
-                if entry.get("cell_color") == "green" and entry.get("is_language"):
-                    if language:
-                        if language.lower() not in entry["text"].lower():
-                            continue
-                    else:
-                        continue
-                processed_text = process_entry_by_week(entry["text"], week_type)
-                filtered_entries.append(processed_text)
-            if filtered_entries:
-                time_text = lesson["time"].replace('.', ':')
-                output_lines.append(f"{lesson.get('number')}. {time_text}: " + "; ".join(filtered_entries))
-        result[day] = "\n".join(output_lines) if output_lines else "На этот день нет занятий."
-    return result
+        return {}
+    return {
+        day: _cached_day(schedule_data, course, group, day, program, language, week_type)
+        for day in range(6)
+    }
 
 def get_available_languages(group: str, course, program: str = None) -> list:
     """
@@ -139,21 +429,19 @@ def get_available_languages(group: str, course, program: str = None) -> list:
     найденных в зелёных ячейках с текстом, содержащим слово "язык".
     """
     course = str(course)
-    if course not in schedule_cache:
-        init_cache_for_course(course)
-    schedule_data = schedule_cache.get(course)
+    schedule_data = _course_data(course)
     if group not in schedule_data:
         return []
+    program = program_code(program)
     languages = set()
     for day, lessons in schedule_data[group].items():
         for lesson in lessons:
-            for entry in lesson.get("entries", []):
-                if entry.get("cell_color") == "green" and entry.get("is_language"):
-                    if program and entry.get("program") and entry["program"] != program:
-                        continue
-                    import re
-                    match = re.search(r"(.+?)\s*язык", entry["text"], re.IGNORECASE)
-                    if match:
-                        lang = match.group(1).strip()
-                        languages.add(lang)
+            for entry in lesson.entries:
+                if entry.flags & FLAG_GREEN_LANGUAGE != FLAG_GREEN_LANGUAGE:
+                    continue
+                if program and entry.program and entry.program != program:
+                    continue
+                match = LANGUAGE_RE.search(entry.text)
+                if match:
+                    languages.add(match.group(1).strip())
     return list(languages)
@@ -0,0 +1,42 @@
+# src/services/diff.py
+"""
+Сравнение двух версий расписания курса.
+
+Уроки сравниваются целиком (Lesson и Entry — неизменяемые dataclass, строки
+интернированы), поэтому совпадающие дни отсеиваются дешёвым сравнением кортежей.
+"""
+
+
+def diff_schedules(old_data, new_data):
+    """
+    Возвращает {group: frozenset(days)} — группы и дни, уроки которых изменились.
+    Появившиеся и исчезнувшие группы попадают в результат со всеми днями.
+    Если прежней версии нет (первая загрузка), возвращает None: изменилось всё.
+    """
+    if old_data is None:
+        return None
+    changes = {}
+    for group in old_data.keys() | new_data.keys():
+        old_days = old_data.get(group)
+        new_days = new_data.get(group)
+        if old_days is new_days:
+            continue
+        if old_days is None or new_days is None:
+            changes[group] = frozenset((old_days or new_days).keys())
+            continue
+        days = frozenset(
+            day for day in old_days.keys() | new_days.keys()
+            if old_days.get(day, ()) != new_days.get(day, ())
+        )
+        if days:
+            changes[group] = days
+    return changes
+
+
+def groups_changed(old_data, new_data):
+    """
+    True, если изменился список групп курса (или его порядок).
+    """
+    if old_data is None:
+        return True
+    return list(old_data) != list(new_data)
@@ -0,0 +1,127 @@
+# src/services/group_index.py
+"""
+Поиск группы по названию среди всех курсов.
+
+Индекс строится при загрузке расписаний и перестраивается, только когда
+меняется список групп какого-либо курса. Названия нормализуются (регистр,
+ё/е, без пробелов и знаков), поэтому «икб 01», «ИКБ-01» и «икб01» совпадают.
+Сначала ищутся названия, начинающиеся с запроса (двоичный поиск по
+отсортированному списку), затем, если их мало, похожие по триграммам —
+на случай опечаток и запроса по середине названия. Результаты кэшируются
+по нормализованному запросу, кэш сбрасывается при перестройке индекса.
+"""
+import bisect
+import logging
+import re
+from services.cache import add_reload_listener
+from services.diff import groups_changed
+from utils.lru import LRUCache
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Минимальная похожесть (коэффициент Дайса по триграммам) для нечёткого совпадения
+FUZZY_THRESHOLD = 0.3
+DEFAULT_LIMIT = 10
+
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+# Группы по курсам: course -> список названий в порядке файла
+_groups = {}
+# Отсортированные нормализованные названия и соответствующие (course, group)
+_keys = []
+_entries = []
+# Триграмма -> номера записей в _entries и число триграмм каждого ключа
+_trigrams = {}
+_trigram_counts = []
+# (нормализованный запрос, limit) -> кортеж (course, group)
+_results = LRUCache(1024)
+
+metrics.register_cache("group_search", lambda: (_results.hits, _results.misses))
+
+
+def normalize(text: str) -> str:
+    return _NON_WORD_RE.sub("", text.lower().replace("ё", "е"))
+
+
+def _trigrams_of(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _rebuild():
+    entries = sorted(
+        (normalize(group), int(course) if course.isdigit() else course, course, group)
+        for course, groups in _groups.items()
+        for group in groups
+    )
+    _keys[:] = [key for key, _, _, _ in entries]
+    _entries[:] = [(course, group) for _, _, course, group in entries]
+    _trigrams.clear()
+    _trigram_counts.clear()
+    for i, key in enumerate(_keys):
+        trigrams = _trigrams_of(key)
+        _trigram_counts.append(len(trigrams))
+        for trigram in trigrams:
+            _trigrams.setdefault(trigram, []).append(i)
+    _results.invalidate()
+
+
+def set_course_groups(course, groups):
+    """
+    Заменяет группы курса в индексе и перестраивает его.
+    """
+    _groups[str(course)] = list(groups)
+    _rebuild()
+    logger.debug("Индекс групп перестроен: %d групп", len(_entries))
+
+
+def _on_schedule_reload(course, old_data, new_data, changes):
+    if groups_changed(old_data, new_data):
+        set_course_groups(course, new_data.keys())
+
+
+add_reload_listener(_on_schedule_reload)
+
+
+def _prefix_matches(query):
+    start = bisect.bisect_left(_keys, query)
+    # Ключи с префиксом query лежат подряд: от query до query + "\uffff"
+    end = bisect.bisect_left(_keys, query + "\uffff", start)
+    return range(start, end)
+
+
+def _fuzzy_matches(query, exclude):
+    trigrams = _trigrams_of(query)
+    common = {}
+    for trigram in trigrams:
+        for i in _trigrams.get(trigram, ()):
+            common[i] = common.get(i, 0) + 1
+    scored = []
+    for i, count in common.items():
+        if i in exclude:
+            continue
+        score = 2 * count / (len(trigrams) + _trigram_counts[i])
+        if score >= FUZZY_THRESHOLD:
+            scored.append((-score, i))
+    scored.sort()
+    return [i for _, i in scored]
+
+
+def search_groups(text: str, limit: int = DEFAULT_LIMIT):
+    """
+    Возвращает до limit пар (course, group), подходящих под запрос:
+    сначала совпадения по началу названия, затем похожие.
+    """
+    query = normalize(text)
+    if not query:
+        return ()
+    key = (query, limit)
+    results = _results.get(key)
+    if results is None:
+        found = list(_prefix_matches(query)[:limit])
+        if len(found) < limit:
+            found += _fuzzy_matches(query, set(found))[:limit - len(found)]
+        results = tuple(_entries[i] for i in found)
+        _results.put(key, results)
+    return results
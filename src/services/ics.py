@@ -0,0 +1,212 @@
+# src/services/ics.py
+"""
+Экспорт расписания группы в iCalendar (.ics).
+
+Недельное расписание разворачивается в события с конкретными датами на весь
+семестр. Тип недели для каждой даты берётся из get_week_type (то же правило
+чётности, что и в /week), записи фильтруются тем же filter_lessons, что и
+текст расписания. Файл выдаётся построчно генератором iter_calendar.
+
+Готовые файлы кэшируются по ключу профиля вместе с хэшем содержимого и
+сбрасываются, только когда меняется расписание группы. По хэшу запоминается
+file_id, под которым Telegram уже хранит такой файл: одинаковые файлы
+(например, у всех студентов группы) загружаются один раз.
+"""
+import datetime
+import hashlib
+import io
+import re
+from config import SEMESTER_START, SEMESTER_END
+from services.cache import add_reload_listener, filter_lessons, get_week_type
+from services.notification import TIMEZONE
+from utils.lru import LRUCache
+from utils import metrics
+
+PRODID = "-//schedule-rudn//Расписание РУДН//RU"
+# Время пары в ячейке: "9.00-10.20", "09:00 – 10:20"
+LESSON_TIME_RE = re.compile(r"(\d{1,2})[.:](\d{2})\s*[-–—]\s*(\d{1,2})[.:](\d{2})")
+# Длина строки iCalendar в октетах, после которой строка переносится (RFC 5545, 3.1)
+LINE_OCTETS = 75
+DAYS_PER_WEEK = 6
+# С этого месяца /ics выгружает осенний семестр: летом — предстоящий, а не закончившийся весенний
+AUTUMN_FROM_MONTH = 7
+
+# (course, group, program, language, start, end) -> (digest, payload)
+_feeds = LRUCache(256)
+# digest -> file_id файла, уже загруженного в Telegram
+_file_ids = LRUCache(1024)
+
+metrics.register_cache("ics", lambda: (_feeds.hits, _feeds.misses))
+
+
+def _invalidate_feeds(course, old_data, new_data, changes):
+    if changes is None:
+        _feeds.invalidate(lambda key: key[0] == course)
+    else:
+        _feeds.invalidate(lambda key: key[0] == course and key[1] in changes)
+
+
+add_reload_listener(_invalidate_feeds)
+
+
+def _configured_bounds():
+    """
+    Границы из SEMESTER_START/SEMESTER_END или None, если обе не заданы.
+    Ошибка в настройке останавливает запуск, а не молча заменяется семестром по умолчанию.
+    """
+    if not SEMESTER_START and not SEMESTER_END:
+        return None
+    if not SEMESTER_START or not SEMESTER_END:
+        raise ValueError("SEMESTER_START и SEMESTER_END задаются только вместе")
+    try:
+        start, end = datetime.date.fromisoformat(SEMESTER_START), datetime.date.fromisoformat(SEMESTER_END)
+    except ValueError:
+        raise ValueError(
+            f"SEMESTER_START и SEMESTER_END должны быть датами ГГГГ-ММ-ДД: {SEMESTER_START!r}, {SEMESTER_END!r}"
+        ) from None
+    if start > end:
+        raise ValueError(f"SEMESTER_START ({start}) позже SEMESTER_END ({end})")
+    return start, end
+
+
+_CONFIGURED_BOUNDS = _configured_bounds()
+
+
+def semester_bounds(today: datetime.date):
+    """
+    (первый, последний) день семестра: из SEMESTER_START/SEMESTER_END или по дате.
+    С января по июнь — весенний семестр (1 февраля – 30 июня), с июля по декабрь —
+    осенний (1 сентября – 31 декабря), летом — предстоящий.
+    """
+    if _CONFIGURED_BOUNDS is not None:
+        return _CONFIGURED_BOUNDS
+    if today.month >= AUTUMN_FROM_MONTH:
+        return datetime.date(today.year, 9, 1), datetime.date(today.year, 12, 31)
+    return datetime.date(today.year, 2, 1), datetime.date(today.year, 6, 30)
+
+
+def _escape(text: str) -> str:
+    return (
+        text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+
+def _fold(line: str) -> str:
+    """
+    Переносит строку длиннее 75 октетов: продолжение начинается с пробела.
+    Многобайтовые символы UTF-8 не разрываются.
+    """
+    if len(line.encode("utf-8")) <= LINE_OCTETS:
+        return line + "\r\n"
+    parts = []
+    current, size = [], 0
+    for char in line:
+        char_size = len(char.encode("utf-8"))
+        limit = LINE_OCTETS if not parts else LINE_OCTETS - 1
+        if size + char_size > limit:
+            parts.append("".join(current))
+            current, size = [], 0
+        current.append(char)
+        size += char_size
+    parts.append("".join(current))
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _utc_offset(date):
+    # Смещение часового пояса на дату: в течение учебного дня оно не меняется
+    return TIMEZONE.localize(datetime.datetime.combine(date, datetime.time(12))).utcoffset()
+
+
+def _utc(date, hour, minute, offset):
+    local = datetime.datetime.combine(date, datetime.time(hour, minute))
+    return (local - offset).strftime("%Y%m%dT%H%M%SZ")
+
+
+def _day_events(lessons, program, language, week_type):
+    """
+    События одного дня недели: (начало, конец, номер пары, текст).
+    Уроки без распознаваемого времени пропускаются.
+    """
+    for lesson, texts in filter_lessons(lessons, program, language, week_type):
+        match = LESSON_TIME_RE.search(lesson.time or "")
+        if match is None:
+            continue
+        h1, m1, h2, m2 = map(int, match.groups())
+        yield (h1, m1), (h2, m2), lesson.number, "; ".join(texts)
+
+
+def iter_calendar(group_days, group, program, language, start, end):
+    """
+    Генератор строк .ics (с CRLF) для группы на даты start..end включительно.
+    group_days — schedule_data[group]; события дня недели и типа недели
+    собираются один раз и повторяются для всех подходящих дат.
+    """
+    feed_id = hashlib.sha1(f"{group}|{program}|{language}".encode("utf-8")).hexdigest()[:12]
+    # Отметка создания фиксирована, чтобы одинаковое расписание давало одинаковый файл
+    stamp = start.strftime("%Y%m%dT000000Z")
+    for line in (
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_escape(f'Расписание {group}')}",
+        "X-WR-TIMEZONE:Europe/Moscow",
+    ):
+        yield _fold(line)
+
+    events = {}
+    date = start
+    while date <= end:
+        weekday = date.weekday()
+        if weekday < DAYS_PER_WEEK:
+            week_type = get_week_type(date)
+            key = (weekday, week_type)
+            if key not in events:
+                events[key] = list(_day_events(group_days.get(weekday, ()), program, language, week_type))
+            offset = _utc_offset(date) if events[key] else None
+            day = date.strftime("%Y%m%d")
+            for (h1, m1), (h2, m2), number, summary in events[key]:
+                for line in (
+                    "BEGIN:VEVENT",
+                    f"UID:{day}T{h1:02d}{m1:02d}-{feed_id}@schedule-rudn",
+                    f"DTSTAMP:{stamp}",
+                    f"DTSTART:{_utc(date, h1, m1, offset)}",
+                    f"DTEND:{_utc(date, h2, m2, offset)}",
+                    f"SUMMARY:{_escape(summary)}",
+                    f"DESCRIPTION:{_escape(f'{group}, {number} пара')}",
+                    "END:VEVENT",
+                ):
+                    yield _fold(line)
+        date += datetime.timedelta(days=1)
+    yield "END:VCALENDAR\r\n"
+
+
+def get_calendar(schedule_data, course, group, program=None, language=None, today=None):
+    """
+    Возвращает (digest, payload, start, end) — файл .ics группы на текущий семестр.
+    Файл собирается из генератора и одновременно хэшируется; результат
+    кэшируется до изменения расписания группы.
+    """
+    start, end = semester_bounds(today or datetime.date.today())
+    key = (str(course), group, program, language, start, end)
+    cached = _feeds.get(key)
+    if cached is None:
+        digest = hashlib.sha256()
+        buffer = io.BytesIO()
+        for line in iter_calendar(schedule_data[group], group, program, language, start, end):
+            chunk = line.encode("utf-8")
+            digest.update(chunk)
+            buffer.write(chunk)
+        cached = (digest.hexdigest(), buffer.getvalue())
+        _feeds.put(key, cached)
+    return cached[0], cached[1], start, end
+
+
+def cached_file_id(digest):
+    return _file_ids.get(digest)
+
+
+def remember_file_id(digest, file_id):
+    _file_ids.put(digest, file_id)
@@ -0,0 +1,86 @@
+# src/services/model.py
+"""
+Компактное представление разобранного расписания.
+
+schedule_data[group][day] — кортеж Lesson, у каждого урока кортеж Entry.
+Строки интернируются, поэтому одинаковые тексты и время во всех группах
+хранятся в одном экземпляре. Программа кодируется числом, а цвет ячейки
+и признак языка — битовыми флагами.
+"""
+import sys
+from dataclasses import dataclass
+
+PROGRAM_NONE = 0
+PROGRAM_FGOS = 1
+PROGRAM_MP = 2
+# Код для программы пользователя, которой нет в PROGRAM_CODES: любые помеченные записи не подходят
+PROGRAM_OTHER = 255
+PROGRAM_CODES = {"ФГОС": PROGRAM_FGOS, "МП": PROGRAM_MP}
+PROGRAM_NAMES = {code: name for name, code in PROGRAM_CODES.items()}
+
+FLAG_BLUE = 1
+FLAG_GREEN = 2
+FLAG_LANGUAGE = 4
+# Запись про язык в зелёной ячейке — показывается только при совпадении языка пользователя
+FLAG_GREEN_LANGUAGE = FLAG_GREEN | FLAG_LANGUAGE
+
+COLOR_FLAGS = {"blue": FLAG_BLUE, "green": FLAG_GREEN}
+
+# Учебные дни: индекс совпадает с ключом дня в schedule_data[group]
+DAY_NAMES = ["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота"]
+
+
+def program_code(program) -> int:
+    """
+    Переводит программу пользователя ("ФГОС", "МП" или None) в код для фильтра.
+    """
+    if not program:
+        return PROGRAM_NONE
+    return PROGRAM_CODES.get(program, PROGRAM_OTHER)
+
+
+def split_by_week(text: str):
+    """
+    Возвращает (текст верхней недели, текст нижней недели).
+    Если в тексте есть '/', левая часть относится к верхней неделе, правая — к нижней.
+    """
+    if "/" in text:
+        upper, lower = text.split("/", 1)
+        return sys.intern(upper.strip()), sys.intern(lower.strip())
+    return text, text
+
+
+@dataclass(frozen=True, slots=True)
+class Entry:
+    text: str
+    program: int
+    flags: int
+    upper: str
+    lower: str
+    # Текст в нижнем регистре для поиска языка; заполняется только для языковых записей
+    search_text: str = None
+
+    @classmethod
+    def build(cls, text: str, program: int, flags: int):
+        text = sys.intern(text)
+        upper, lower = split_by_week(text)
+        search_text = sys.intern(text.lower()) if flags & FLAG_LANGUAGE else None
+        return cls(text, program, flags, upper, lower, search_text)
+
+    @property
+    def is_language(self) -> bool:
+        return bool(self.flags & FLAG_LANGUAGE)
+
+    @property
+    def program_name(self):
+        return PROGRAM_NAMES.get(self.program)
+
+    def week_text(self, week_type: str) -> str:
+        return self.upper if week_type == "upper" else self.lower
+
+
+@dataclass(frozen=True, slots=True)
+class Lesson:
+    number: object
+    time: str
+    entries: tuple
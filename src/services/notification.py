@@ -1,29 +1,255 @@
+import asyncio
 import datetime
+import logging
+import time
 import pytz
-from utils.json_db import load_users
-from services.cache import get_schedule_for_day
+from utils.user_store import load_users, get_profiles, find_subscribers
+from services.cache import get_schedule_for_day, get_week_type, ensure_course, add_reload_listener, render_version_day
+from services.outbound import broadcast, sender
+from services.model import DAY_NAMES
+from utils import metrics, sharding
+from config import NOTIFY_SCHEDULE_CHANGES, SCHEDULE_STORE
+
+logger = logging.getLogger(__name__)
 
 # Используем московский часовой пояс
 TIMEZONE = pytz.timezone("Europe/Moscow")
 
+# Время для подписчиков, у которых оно не задано (раньше рассылка была только в 07:00)
+DEFAULT_NOTIFICATION_TIME = "07:00"
+# Слоты начиная с этого часа присылают расписание на завтра
+EVENING_FROM_HOUR = 12
+
+# Индекс подписчиков: время оповещения ("20:00") -> множество user_id
+_buckets = {}
+# Обратный индекс: user_id -> время, в чьей корзине находится пользователь
+_slot_by_user = {}
+_job_queue = None
+
+def _job_name(slot):
+    return f"daily_schedule:{slot}"
+
+def _parse_slot(slot):
+    hour, minute = slot.split(":")
+    return int(hour), int(minute)
+
+def _register_slot(slot):
+    if _job_queue is None or _job_queue.get_jobs_by_name(_job_name(slot)):
+        return
+    hour, minute = _parse_slot(slot)
+    _job_queue.run_daily(
+        callback=send_daily_schedule,
+        time=datetime.time(hour=hour, minute=minute, tzinfo=TIMEZONE),
+        name=_job_name(slot),
+        data=slot
+    )
+    logger.info("Зарегистрирована рассылка на %s", slot)
+
+def _unregister_slot(slot):
+    if _job_queue is None:
+        return
+    for job in _job_queue.get_jobs_by_name(_job_name(slot)):
+        job.schedule_removal()
+    logger.info("Рассылка на %s снята: подписчиков не осталось", slot)
+
+def update_subscription(user_id, notification_time, subscribed):
+    """
+    Переносит пользователя в корзину его времени оповещения (или убирает из индекса).
+    Задачи JobQueue добавляются при появлении нового времени и снимаются,
+    когда корзина опустела.
+    """
+    # Пользователь другого шарда есть в индексе своего воркера: иначе рассылка ушла бы дважды
+    if not sharding.owns(user_id):
+        return
+    user_id = str(user_id)
+    new_slot = (notification_time or DEFAULT_NOTIFICATION_TIME) if subscribed else None
+    old_slot = _slot_by_user.get(user_id)
+    if old_slot == new_slot:
+        return
+    if old_slot is not None:
+        bucket = _buckets.get(old_slot)
+        bucket.discard(user_id)
+        if not bucket:
+            del _buckets[old_slot]
+            _unregister_slot(old_slot)
+        del _slot_by_user[user_id]
+    if new_slot is not None:
+        bucket = _buckets.setdefault(new_slot, set())
+        if not bucket:
+            _register_slot(new_slot)
+        bucket.add(user_id)
+        _slot_by_user[user_id] = new_slot
+
+def sync_profile(profile):
+    """
+    Обновляет индекс после изменения подписки или времени в профиле пользователя.
+    """
+    update_subscription(profile.user_id, profile.notification_time, profile.subscribed)
+
+def build_index(users):
+    _buckets.clear()
+    _slot_by_user.clear()
+    for user_id, user_data in users.items():
+        update_subscription(user_id, user_data.get("notification_time"), user_data.get("subscribed"))
+
+def target_date(slot, now):
+    """
+    Утренние слоты присылают расписание на сегодня, вечерние — на завтра.
+    """
+    hour, _ = _parse_slot(slot)
+    if hour >= EVENING_FROM_HOUR:
+        return now.date() + datetime.timedelta(days=1), "завтра"
+    return now.date(), "сегодня"
+
+def group_by_profile(profiles):
+    """
+    Группирует подписчиков по ключу (course, group, program, language):
+    всем пользователям с одинаковым ключом уходит один и тот же текст.
+    """
+    recipients = {}
+    for profile in profiles:
+        if not profile.subscribed or not profile.course or not profile.group:
+            continue
+        key = (profile.course, profile.group, profile.program, profile.language)
+        recipients.setdefault(key, []).append(profile.user_id)
+    return recipients
+
+async def render_messages(keys, weekday, week_type, day_label):
+    """
+    Отрисовывает по одному сообщению на каждый ключ профиля.
+    """
+    messages = {}
+    for key in keys:
+        course, group, program, language = key
+        try:
+            await ensure_course(course)
+        except Exception:
+            logger.exception("Не удалось загрузить расписание курса %s", course)
+            continue
+        schedule_text = get_schedule_for_day(group, weekday, course, program=program, language=language, week_type=week_type)
+        messages[key] = f"Ваше расписание на {day_label}:\n\n{schedule_text}"
+    return messages
+
+async def run_broadcast(bot, user_ids, date, day_label):
+    """
+    Рассылает расписание на date указанным пользователям.
+    Профили читаются одним пакетом, каждый уникальный текст отрисовывается один раз,
+    а затем раздаётся всем его получателям через очередь отправки.
+    Возвращает статистику прогона.
+    """
+    start = time.perf_counter()
+    weekday = date.weekday()  # 0 - понедельник, 6 - воскресенье
+    week_type = get_week_type(date)
+    recipients = group_by_profile(get_profiles(user_ids))
+    messages = await render_messages(recipients.keys(), weekday, week_type, day_label)
+    render_ms = (time.perf_counter() - start) * 1000
+
+    pending = {}
+    for key, text in messages.items():
+        for user_id in recipients[key]:
+            # Сообщения уходят через общую очередь с низким приоритетом, не мешая ответам на команды
+            pending[user_id] = broadcast(bot, user_id, text)
+
+    results = await asyncio.gather(*pending.values(), return_exceptions=True)
+    failed = 0
+    for user_id, result in zip(pending, results):
+        if isinstance(result, Exception):
+            failed += 1
+            logger.warning("Не удалось отправить расписание пользователю %s: %s", user_id, result)
+    elapsed = time.perf_counter() - start
+    metrics.broadcast_messages.inc("sent", amount=len(pending) - failed)
+    metrics.broadcast_messages.inc("failed", amount=failed)
+    metrics.broadcast_seconds.observe(elapsed)
+    return {
+        "subscribers": sum(len(ids) for ids in recipients.values()),
+        "distinct_renders": len(messages),
+        "sent": len(pending) - failed,
+        "failed": failed,
+        "render_ms": round(render_ms, 1),
+        "elapsed_ms": round(elapsed * 1000, 1),
+    }
+
 async def send_daily_schedule(context):
-    users = load_users()
+    """
+    Рассылка одного слота: обходит только пользователей из его корзины.
+    """
+    slot = context.job.data
     now = datetime.datetime.now(TIMEZONE)
-    weekday = now.weekday()  # 0 - понедельник, 6 - воскресенье
+    date, day_label = target_date(slot, now)
+    if date.weekday() > 5:
+        return None
+    stats = await run_broadcast(context.bot, list(_buckets.get(slot, ())), date, day_label)
+    logger.info("Рассылка %s: %s, очередь: %s", slot, stats, sender.stats())
+    return stats
 
-    for user_id, user_data in users.items():
-        if user_data.get("subscribed"):
-            group = user_data.get("group")
-            if group:
-                schedule_text = get_schedule_for_day(group, weekday)
-                if not schedule_text:
-                    schedule_text = "На сегодня нет занятий."
-                await context.bot.send_message(chat_id=user_id, text=f"Ваше расписание на сегодня:\n\n{schedule_text}")
+def changed_days_by_profile(old_data, new_data, changes, profiles):
+    """
+    Для каждого ключа профиля (course, group, program, language) возвращает дни,
+    в которых изменился видимый пользователю текст хотя бы для одной из недель.
+    Фильтр по программе и языку тот же, что в get_schedule_for_day, поэтому
+    правка в чужой программе или языке уведомления не вызывает.
+    Возвращает пару (дни по ключам, получатели по ключам).
+    """
+    recipients = group_by_profile(profiles)
+    visible = {}
+    for key in recipients:
+        _, group, program, language = key
+        days = sorted(
+            day for day in changes.get(group, ())
+            if day in range(len(DAY_NAMES)) and any(
+                render_version_day(old_data, group, day, program, language, week_type)
+                != render_version_day(new_data, group, day, program, language, week_type)
+                for week_type in ("upper", "lower")
+            )
+        )
+        if days:
+            visible[key] = days
+    return visible, recipients
 
-def schedule_jobs(job_queue):
-    # Планируем ежедневное оповещение в 07:00 по Москве
-    job_queue.run_daily(
-        callback=send_daily_schedule,
-        time=datetime.time(hour=7, minute=0, tzinfo=TIMEZONE),
-        name="daily_schedule"
+async def notify_schedule_changes(bot, course, old_data, new_data, changes):
+    """
+    Сообщает подписчикам изменившихся групп, в какие дни поменялось их расписание.
+    Читаются только подписчики затронутых групп, отрисовываются только изменившиеся дни.
+    """
+    profiles = [profile for profile in find_subscribers(course, changes.keys()) if sharding.owns(profile.user_id)]
+    visible, recipients = changed_days_by_profile(old_data, new_data, changes, profiles)
+    pending = []
+    for key, days in visible.items():
+        group = key[1]
+        text = (
+            f"Расписание группы {group} изменилось: {', '.join(DAY_NAMES[day] for day in days)}.\n"
+            "Актуальное расписание — /week и /nextweek."
+        )
+        pending.extend(broadcast(bot, user_id, text) for user_id in recipients[key])
+    results = await asyncio.gather(*pending, return_exceptions=True)
+    failed = sum(1 for result in results if isinstance(result, Exception))
+    logger.info(
+        "Курс %s: изменились группы %s, уведомлено %d из %d подписчиков (ошибок: %d)",
+        course, sorted(changes), len(pending) - failed, len(profiles), failed
     )
+    return len(pending) - failed
+
+async def _notify_changes_job(context):
+    await notify_schedule_changes(context.bot, *context.job.data)
+
+def _on_schedule_reload(course, old_data, new_data, changes):
+    # Первая загрузка курса (changes is None) — не изменение расписания.
+    # При SCHEDULE_STORE=map об изменениях сообщает процесс-публикатор,
+    # а воркеры диспетчера сообщают каждый своему шарду.
+    if _job_queue is None or not changes or not NOTIFY_SCHEDULE_CHANGES:
+        return
+    if SCHEDULE_STORE == "map" and sharding.SHARD_COUNT == 1:
+        return
+    _job_queue.run_once(_notify_changes_job, 0, data=(course, old_data, new_data, changes), name=f"schedule_changes:{course}")
+
+add_reload_listener(_on_schedule_reload)
+
+def schedule_jobs(job_queue):
+    """
+    Строит индекс подписчиков по времени оповещения и регистрирует
+    по одной ежедневной задаче на каждое встречающееся время.
+    """
+    global _job_queue
+    _job_queue = job_queue
+    build_index(load_users())
+    logger.info("Подписчиков: %d, слотов рассылки: %d", len(_slot_by_user), len(_buckets))
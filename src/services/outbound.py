@@ -0,0 +1,257 @@
+# src/services/outbound.py
+"""
+Центральная очередь исходящих сообщений.
+
+Все ответы обработчиков и рассылки проходят через один отправитель:
+- общий и по-чатовый лимит (token bucket), чтобы не упираться во flood-лимиты Telegram;
+- ограниченное число одновременных запросов (воркеры);
+- повтор при RetryAfter с ожиданием указанного времени и при сетевых ошибках;
+- приоритет: ответы пользователям (INTERACTIVE) обгоняют рассылку (BROADCAST).
+"""
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+from utils import metrics
+from config import OUTBOUND_GLOBAL_RATE, OUTBOUND_PER_CHAT_RATE, OUTBOUND_WORKERS, OUTBOUND_MAX_RETRIES
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BROADCAST = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BROADCAST: "broadcast"}
+
+# Сколько сообщений подряд можно отправить в один чат без ожидания
+PER_CHAT_BURST = 3
+# Порог, после которого из словаря удаляются лимиты простаивающих чатов
+CHAT_BUCKETS_PRUNE_AT = 10000
+
+
+class TokenBucket:
+    """
+    Ведро токенов с резервированием: reserve() всегда забирает токен
+    и возвращает, сколько секунд нужно подождать до его появления.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def is_idle(self) -> bool:
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+
+class _Job:
+    __slots__ = ("chat_id", "call", "future", "priority", "attempts")
+
+    def __init__(self, chat_id, call, future, priority):
+        self.chat_id = chat_id
+        self.call = call
+        self.future = future
+        self.priority = priority
+        self.attempts = 0
+
+
+class OutboundSender:
+    def __init__(self, global_rate=OUTBOUND_GLOBAL_RATE, per_chat_rate=OUTBOUND_PER_CHAT_RATE,
+                 workers=OUTBOUND_WORKERS, max_retries=OUTBOUND_MAX_RETRIES):
+        self.per_chat_rate = per_chat_rate
+        self.workers = workers
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chat_buckets = {}
+        self._paused_until = 0.0
+        self._queue = None
+        self._seq = itertools.count()
+        self._tasks = []
+        self._depth = {INTERACTIVE: 0, BROADCAST: 0}
+        self._sent_times = deque(maxlen=10000)
+        self.counters = {"enqueued": 0, "sent": 0, "failed": 0, "retried": 0}
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker(), name=f"outbound-{i}") for i in range(self.workers)]
+
+    async def stop(self, timeout: float = 10.0):
+        """
+        Даёт очереди догрузиться (не дольше timeout секунд) и останавливает воркеров.
+        """
+        if not self._tasks:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Очередь отправки не опустела за %.0f с, осталось %d", timeout, self._queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, chat_id, call, priority=INTERACTIVE) -> asyncio.Future:
+        """
+        Ставит вызов API в очередь и возвращает future с его результатом.
+        call — функция без аргументов, возвращающая корутину (например, lambda: bot.send_message(...)).
+        Если отправитель не запущен, вызов выполняется сразу.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self._tasks:
+            task = loop.create_task(call())
+            task.add_done_callback(lambda t: _copy_result(t, future))
+            return future
+        self.counters["enqueued"] += 1
+        self._depth[priority] += 1
+        self._queue.put_nowait((priority, next(self._seq), _Job(chat_id, call, future, priority)))
+        return future
+
+    async def send(self, chat_id, call, priority=INTERACTIVE):
+        return await self.submit(chat_id, call, priority)
+
+    def _chat_bucket(self, chat_id) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= CHAT_BUCKETS_PRUNE_AT:
+                self._chat_buckets = {cid: b for cid, b in self._chat_buckets.items() if not b.is_idle()}
+            bucket = TokenBucket(self.per_chat_rate, PER_CHAT_BURST)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def _wait_for_slot(self, chat_id):
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        delay = max(self._global.reserve(), self._chat_bucket(chat_id).reserve())
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _worker(self):
+        while True:
+            priority, seq, job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job):
+        if job.future.cancelled():
+            self._depth[job.priority] -= 1
+            return
+        await self._wait_for_slot(job.chat_id)
+        job.attempts += 1
+        try:
+            result = await job.call()
+        except RetryAfter as exc:
+            # Flood-лимит касается всего бота: приостанавливаем всю очередь
+            self._paused_until = max(self._paused_until, time.monotonic() + exc.retry_after)
+            logger.warning("RetryAfter %s с для чата %s", exc.retry_after, job.chat_id)
+            self._retry_or_fail(job, exc)
+        except (BadRequest, Forbidden) as exc:
+            self._fail(job, exc)
+        except NetworkError as exc:
+            self._retry_or_fail(job, exc)
+        except Exception as exc:
+            self._fail(job, exc)
+        else:
+            self._depth[job.priority] -= 1
+            self.counters["sent"] += 1
+            self._sent_times.append(time.monotonic())
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def _retry_or_fail(self, job, exc):
+        if job.attempts > self.max_retries:
+            self._fail(job, exc)
+            return
+        self.counters["retried"] += 1
+        self._queue.put_nowait((job.priority, next(self._seq), job))
+
+    def _fail(self, job, exc):
+        self._depth[job.priority] -= 1
+        self.counters["failed"] += 1
+        if not job.future.done():
+            job.future.set_exception(exc)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        recent = sum(1 for t in self._sent_times if now - t <= 60)
+        return {
+            **self.counters,
+            "depth": sum(self._depth.values()),
+            **{f"depth_{name}": self._depth[p] for p, name in PRIORITY_NAMES.items()},
+            "sent_per_second_1m": recent / 60,
+        }
+
+
+def _copy_result(task, future):
+    if future.cancelled():
+        return
+    if task.cancelled():
+        future.cancel()
+    elif task.exception() is not None:
+        future.set_exception(task.exception())
+    else:
+        future.set_result(task.result())
+
+
+sender = OutboundSender()
+
+metrics.CounterFunc(
+    "bot_outbound_messages_total", "Запросы через очередь исходящих сообщений",
+    lambda: [((name,), value) for name, value in sender.counters.items()], ("result",),
+)
+metrics.Gauge(
+    "bot_outbound_queue_depth", "Запросы в очереди исходящих сообщений",
+    lambda: [((name,), sender._depth[p]) for p, name in PRIORITY_NAMES.items()], ("priority",),
+)
+
+
+async def reply(message, text, **kwargs):
+    """
+    Ответ пользователю (message.reply_text) через очередь с интерактивным приоритетом.
+    """
+    return await sender.send(message.chat_id, lambda: message.reply_text(text, **kwargs))
+
+
+async def reply_document(message, document, **kwargs):
+    """
+    Отправка файла в ответ пользователю через очередь с интерактивным приоритетом.
+    """
+    return await sender.send(message.chat_id, lambda: message.reply_document(document, **kwargs))
+
+
+async def edit_text(query, text, **kwargs):
+    return await sender.send(query.from_user.id, lambda: query.edit_message_text(text, **kwargs))
+
+
+async def edit_markup(query, **kwargs):
+    return await sender.send(query.from_user.id, lambda: query.edit_message_reply_markup(**kwargs))
+
+
+def broadcast(bot, chat_id, text, **kwargs) -> asyncio.Future:
+    """
+    Ставит сообщение рассылки в очередь с низким приоритетом, не дожидаясь отправки.
+    """
+    return sender.submit(chat_id, lambda: bot.send_message(chat_id=chat_id, text=text, **kwargs), BROADCAST)
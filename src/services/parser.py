@@ -1,6 +1,22 @@
 # src/services/parser.py
+import itertools
+import logging
+import math
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 import openpyxl
+from openpyxl.cell.read_only import EMPTY_CELL
+from config import PARSE_SHEET_WORKERS
+from services.model import Entry, Lesson, FLAG_BLUE, FLAG_GREEN, FLAG_LANGUAGE, PROGRAM_NONE, PROGRAM_FGOS, PROGRAM_MP
 
+logger = logging.getLogger(__name__)
+
+# Стандартная раскладка файлов расписания. parse_schedule определяет раскладку
+# каждого листа сам; эти константы использует прежний parse_schedule_full
+# и генератор синтетических файлов в benchmarks.
 # Определяем диапазоны строк для дней (например, Пн: строки 5–13, Вт: 14–22 и т.д.)
 DAY_RANGES = {
     0: range(5, 14),   # Понедельник
@@ -11,104 +27,413 @@ DAY_RANGES = {
     5: range(50, 59),  # Суббота
 }
 
+HEADER_ROW = 4                # Строка с названиями групп
+NUMBER_COLUMN = 3             # C — номер пары
+TIME_COLUMN = 4               # D — время
+GROUP_COLUMNS = range(5, 20)  # E=5, ..., S=19 (всего может быть 15+ групп)
+
+# Обратный индекс: номер строки -> день недели
+ROW_TO_DAY = {row: day for day, rows in DAY_RANGES.items() for row in rows}
+LAST_ROW = max(ROW_TO_DAY)
+
 def process_lesson_cell(cell):
     """
-    Обрабатывает ячейку урока и возвращает список записей.
-    Каждая запись – словарь с ключами:
+    Обрабатывает ячейку урока и возвращает кортеж записей Entry.
+    Для каждой записи определяется:
       - text: текст урока,
-      - program: "ФГОС" или "МП", если встречается,
-      - is_language: True, если в тексте есть слово "язык",
-      - cell_color: "blue" или "green" (определяется по RGB).
+      - program: PROGRAM_FGOS или PROGRAM_MP, если встречается "ФГОС"/"МП",
+      - флаг FLAG_LANGUAGE, если в тексте есть слово "язык",
+      - флаг цвета ячейки FLAG_BLUE или FLAG_GREEN (определяется по RGB).
     """
     text = cell.value
     if text is None:
-        return []
+        return ()
     text = str(text).strip()
 
     # Определяем цвет ячейки
     color_rgb = cell.fill.fgColor.rgb
-    cell_color = "default"
+    color_flags = 0
     if color_rgb:
         if color_rgb.startswith("FF"):
             color_hex = color_rgb[2:]
         else:
             color_hex = color_rgb
         if color_hex.upper() == "7DB4F0":  # синий
-            cell_color = "blue"
+            color_flags = FLAG_BLUE
         elif color_hex.upper() == "70AD47":  # зелёный
-            cell_color = "green"
-        else:
-            cell_color = "default"
+            color_flags = FLAG_GREEN
 
     # Если вариантов несколько, разделённых символом "|"
     parts = text.split("|")
     entries = []
     for part in parts:
         part = part.strip()
-        program_marker = None
+        program = PROGRAM_NONE
         if "ФГОС" in part:
-            program_marker = "ФГОС"
+            program = PROGRAM_FGOS
         elif "МП" in part:
-            program_marker = "МП"
-        is_language = "язык" in part.lower()
-        entries.append({
-            "text": part,
-            "program": program_marker,
-            "is_language": is_language,
-            "cell_color": cell_color
-        })
-    return entries
-
-def parse_schedule(excel_path: str):
-    print(f"[parser.py] Открываем файл: {excel_path}")
-    wb = openpyxl.load_workbook(excel_path)
-    sheet = wb.active
+            program = PROGRAM_MP
+        flags = color_flags
+        if "язык" in part.lower():
+            flags |= FLAG_LANGUAGE
+        entries.append(Entry.build(part, program, flags))
+    return tuple(entries)
 
-    # Считываем названия групп из 4-й строки (E4..S4).
+def _read_group_names(get_value):
+    """
+    Считывает названия групп из строки заголовка.
+    get_value(col_idx) возвращает значение ячейки заголовка.
+    Пустая ячейка (объединённая) наследует предыдущее название.
+    """
     group_names = {}
     last_value = None
-    for col_idx in range(5, 20):  # E=5, ..., S=19 (всего может быть 15+ групп)
-        cell_value = sheet.cell(row=4, column=col_idx).value
+    for col_idx in GROUP_COLUMNS:
+        cell_value = get_value(col_idx)
         if cell_value:
-            last_value = str(cell_value).strip()
-            group_names[col_idx] = last_value
-        else:
-            group_names[col_idx] = last_value  # Если пустая, используем предыдущее значение.
-        print(f"DEBUG: col={col_idx} -> group_name='{group_names[col_idx]}'")
+            last_value = sys.intern(str(cell_value).strip())
+        group_names[col_idx] = last_value  # Если пустая, используем предыдущее значение.
+        logger.debug("col=%s -> group_name='%s'", col_idx, group_names[col_idx])
+    return group_names
 
+def _empty_schedule(group_names):
     # Инициализируем структуру: schedule_data[group][day] = список уроков.
     schedule_data = {}
+    for group in group_names.values():
+        if group is not None and group not in schedule_data:
+            schedule_data[group] = {day: [] for day in DAY_RANGES}
+    return schedule_data
+
+def _add_row(schedule_data, group_names, day, lesson_number, time_val, get_cell):
+    """
+    Добавляет в schedule_data уроки одной строки листа.
+    """
+    if not time_val:
+        return
+    time_text = sys.intern(str(time_val).strip())
     for col_idx, group in group_names.items():
         if group is None:
             continue
-        if group not in schedule_data:
-            schedule_data[group] = {day: [] for day in DAY_RANGES}
+        entries = process_lesson_cell(get_cell(col_idx))
+        if entries:
+            schedule_data[group][day].append(Lesson(lesson_number, time_text, entries))
 
-    for day, rows in DAY_RANGES.items():
-        for row in rows:
-            # Читаем номер пары из столбца C (column 3)
-            lesson_number = sheet.cell(row=row, column=3).value
-            # Читаем время из столбца D (column 4)
-            time_cell = sheet.cell(row=row, column=4)
-            time_val = time_cell.value
-            if not time_val:
-                continue
-            time_text = str(time_val).strip()
-            for col_idx, group in group_names.items():
-                if group is None:
-                    continue
-                cell = sheet.cell(row=row, column=col_idx)
-                entries = process_lesson_cell(cell)
-                if entries:
-                    schedule_data[group][day].append({
-                        "number": lesson_number,
-                        "time": time_text,
-                        "entries": entries
-                    })
-    print("\n[parser.py] Итоговое расписание (schedule_data):")
+def _freeze(schedule_data):
+    """
+    Превращает списки уроков в кортежи: после разбора расписание только читается.
+    """
+    return {
+        group: {day: tuple(lessons) for day, lessons in days.items()}
+        for group, days in schedule_data.items()
+    }
+
+def _log_schedule(schedule_data):
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    logger.debug("Итоговое расписание (schedule_data):")
     for grp, days in schedule_data.items():
-        print(f"Группа '{grp}':")
+        logger.debug("Группа '%s':", grp)
         for d, lessons in days.items():
-            print(f"  День {d} => {lessons}")
-    print("[parser.py] Конец вывода расписания.\n")
+            logger.debug("  День %s => %s", d, lessons)
+
+# Распознавание раскладки листа
+# Время пары: "9.00-10.20", "9:00 - 10:20" или просто начало пары
+TIME_RE = re.compile(r"^\s*(\d{1,2})[.:](\d{2})")
+WEEKDAYS = {
+    "понедельник": 0, "вторник": 1, "среда": 2, "четверг": 3, "пятница": 4, "суббота": 5,
+    "пн": 0, "вт": 1, "ср": 2, "чт": 3, "пт": 4, "сб": 5,
+}
+# Сколько верхних строк листа просматривается для поиска заголовка и служебных столбцов
+DETECT_ROWS = 40
+# Листы разбираются параллельно, если файл больше этого размера и листов несколько
+PARALLEL_MIN_BYTES = 2 * 1024 * 1024
+
+
+@dataclass(frozen=True)
+class SheetLayout:
+    """
+    Раскладка листа расписания (номера строк и столбцов с 1).
+    day_column и number_column могут отсутствовать: тогда новый день
+    определяется по сбросу нумерации или времени пар.
+    """
+    header_row: int
+    time_column: int
+    number_column: int = None
+    day_column: int = None
+    group_names: dict = field(default_factory=dict)
+
+    @property
+    def last_column(self):
+        return max(self.group_names) if self.group_names else self.time_column
+
+
+def _weekday(value):
+    if not isinstance(value, str):
+        return None
+    text = value.strip().lower()
+    if text in WEEKDAYS:
+        return WEEKDAYS[text]
+    for name, day in WEEKDAYS.items():
+        if len(name) > 2 and text.startswith(name):
+            return day
+    return None
+
+
+def _is_time(value):
+    return isinstance(value, str) and TIME_RE.match(value) is not None
+
+
+def _is_number(value):
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return True
+    return isinstance(value, str) and value.strip().isdigit()
+
+
+def _detected_group_names(header, time_column):
+    """
+    Столбцы групп справа от столбца времени. Пустой заголовок — подгруппа
+    предыдущей группы (объединённая ячейка), как и раньше. Пустые столбцы после
+    последнего названия относятся к нему, только пока их не больше самой длинной
+    серии пустых заголовков между названиями.
+    """
+    named = [col for col in range(time_column + 1, len(header) + 1) if header[col - 1] not in (None, "")]
+    if not named:
+        return {}
+    span = max((b - a - 1 for a, b in zip(named, named[1:])), default=0)
+    group_names = {}
+    last_value = None
+    for col in range(named[0], named[-1] + span + 1):
+        value = header[col - 1] if col <= len(header) else None
+        if value not in (None, ""):
+            last_value = sys.intern(str(value).strip())
+        group_names[col] = last_value
+    return group_names
+
+
+def detect_layout(rows):
+    """
+    Определяет раскладку по первым строкам листа (кортежи значений, строки с 1).
+    Столбец времени — тот, где больше всего значений вида "9.00-10.20";
+    заголовок групп — ближайшая непустая строка над первой строкой со временем.
+    Возвращает SheetLayout или None, если лист не похож на расписание.
+    """
+    width = max((len(row) for row in rows), default=0)
+    time_hits = [0] * (width + 1)
+    for row in rows:
+        for col, value in enumerate(row, start=1):
+            if _is_time(value):
+                time_hits[col] += 1
+    time_column = max(range(1, width + 1), key=lambda col: time_hits[col], default=None)
+    if time_column is None or time_hits[time_column] < 2:
+        return None
+
+    time_rows = [i for i, row in enumerate(rows) if len(row) >= time_column and _is_time(row[time_column - 1])]
+    header_index = None
+    for i in range(time_rows[0] - 1, -1, -1):
+        if any(value not in (None, "") for value in rows[i][time_column:]):
+            header_index = i
+            break
+    if header_index is None:
+        return None
+    group_names = _detected_group_names(rows[header_index], time_column)
+    if not group_names:
+        return None
+
+    def column_matches(col, check):
+        values = [rows[i][col - 1] for i in time_rows if len(rows[i]) >= col]
+        return sum(1 for value in values if check(value)) >= len(time_rows) // 2 + 1
+
+    number_column = next(
+        (col for col in range(time_column - 1, 0, -1) if column_matches(col, _is_number)), None
+    )
+    day_column = next(
+        (
+            col for col in range(1, time_column)
+            if col != number_column
+            and any(len(row) >= col and _weekday(row[col - 1]) is not None for row in rows[header_index + 1:])
+        ),
+        None,
+    )
+    return SheetLayout(header_index + 1, time_column, number_column, day_column, group_names)
+
+
+class _DayTracker:
+    """
+    Определяет день недели для строк листа по порядку строк:
+    по названию дня, по сбросу номера пары или по сбросу времени.
+    """
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.day = 0
+        self.last_number = None
+        self.last_start = None
+
+    def _start_minutes(self, time_val):
+        match = re.match(r"\s*(\d{1,2})[.:](\d{2})", time_val)
+        return int(match.group(1)) * 60 + int(match.group(2))
+
+    def day_for(self, day_value, number, time_val):
+        layout = self.layout
+        if layout.day_column is not None:
+            day = _weekday(day_value)
+            if day is not None:
+                self.day = day
+            return self.day
+        if layout.number_column is not None:
+            if _is_number(number):
+                number = int(number)
+                if self.last_number is not None and number <= self.last_number:
+                    self.day += 1
+                self.last_number = number
+            return self.day
+        if _is_time(time_val):
+            start = self._start_minutes(time_val)
+            if self.last_start is not None and start <= self.last_start:
+                self.day += 1
+            self.last_start = start
+        return self.day
+
+
+def _parse_sheet(sheet):
+    """
+    Разбирает один лист за один потоковый проход: первые DETECT_ROWS строк
+    буферизуются для определения раскладки, затем они и остальные строки
+    читаются как строки уроков.
+    Возвращает schedule_data листа или None, если лист не распознан.
+    """
+    rows = sheet.iter_rows()
+    head = []
+    for cells in rows:
+        head.append(cells)
+        if len(head) >= DETECT_ROWS:
+            break
+    layout = detect_layout([tuple(cell.value for cell in cells) for cells in head])
+    if layout is None:
+        logger.info("Лист %r не похож на расписание, пропускаем", sheet.title)
+        return None
+    logger.debug("Лист %r: %s", sheet.title, layout)
+
+    schedule_data = _empty_schedule(layout.group_names)
+    tracker = _DayTracker(layout)
+    ordinal = {}
+    for cells in itertools.chain(head[layout.header_row:], rows):
+        if not cells:
+            continue
+        value = lambda col: cells[col - 1].value if col is not None and col <= len(cells) else None  # noqa: E731
+        time_val = value(layout.time_column)
+        number = value(layout.number_column)
+        day = tracker.day_for(value(layout.day_column), number, time_val)
+        if day not in DAY_RANGES:
+            continue
+        if layout.number_column is None and time_val:
+            number = ordinal[day] = ordinal.get(day, 0) + 1
+        _add_row(
+            schedule_data, layout.group_names, day, number, time_val,
+            lambda col: cells[col - 1] if col <= len(cells) else EMPTY_CELL,
+        )
+    return schedule_data
+
+
+def _merge(target, schedule_data):
+    """
+    Добавляет расписание листа к общему индексу курса. Если группа встречается
+    на нескольких листах, уроки дня объединяются в порядке номера пары,
+    а при равных номерах — по времени начала.
+    """
+    for group, days in schedule_data.items():
+        existing = target.get(group)
+        if existing is None:
+            target[group] = days
+            continue
+        for day, lessons in days.items():
+            if lessons:
+                merged = existing[day] + lessons
+                existing[day] = sorted(merged, key=_lesson_key)
+
+
+def _lesson_key(lesson):
+    """
+    Ключ сортировки урока: (номер пары, начало в минутах). Уроки без номера
+    или без распознаваемого времени идут после остальных; при равных ключах
+    сохраняется порядок листов.
+    """
+    number = float(lesson.number) if _is_number(lesson.number) else math.inf
+    match = TIME_RE.match(lesson.time) if isinstance(lesson.time, str) else None
+    start = int(match.group(1)) * 60 + int(match.group(2)) if match else math.inf
+    return number, start
+
+
+def _parse_sheet_by_name(excel_path, title):
+    """
+    Выполняется в отдельном процессе: открывает книгу и разбирает один лист.
+    """
+    wb = openpyxl.load_workbook(excel_path, read_only=True)
+    try:
+        return _parse_sheet(wb[title])
+    finally:
+        wb.close()
+
+
+def _parse_sheets_parallel(excel_path, titles):
+    workers = min(PARSE_SHEET_WORKERS, len(titles))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_parse_sheet_by_name, [excel_path] * len(titles), titles))
+
+
+def parse_schedule(excel_path: str):
+    """
+    Потоковый разбор файла расписания.
+    Книга открывается в режиме read-only; раскладка (строка заголовка, столбцы
+    времени, номера, дня и групп) определяется для каждого листа по его содержимому.
+    Разбираются все листы, большие книги — параллельно по листам, а группы
+    всех листов сливаются в один индекс курса.
+    """
+    logger.info("Открываем файл: %s", excel_path)
+    wb = openpyxl.load_workbook(excel_path, read_only=True)
+    try:
+        titles = wb.sheetnames
+        parallel = (
+            len(titles) > 1
+            and PARSE_SHEET_WORKERS > 1
+            and os.path.getsize(excel_path) >= PARALLEL_MIN_BYTES
+        )
+        if not parallel:
+            sheets = [_parse_sheet(wb[title]) for title in titles]
+    finally:
+        wb.close()
+    if parallel:
+        sheets = _parse_sheets_parallel(excel_path, titles)
+
+    schedule_data = {}
+    for sheet_data in sheets:
+        if sheet_data:
+            _merge(schedule_data, sheet_data)
+    schedule_data = _freeze(schedule_data)
+    _log_schedule(schedule_data)
+    return schedule_data
+
+def parse_schedule_full(excel_path: str):
+    """
+    Прежний способ разбора: полная загрузка книги и чтение ячеек по одной.
+    Оставлен для сравнения в бенчмарке и для отладки.
+    """
+    logger.info("Открываем файл (полная загрузка): %s", excel_path)
+    wb = openpyxl.load_workbook(excel_path)
+    sheet = wb.active
+
+    group_names = _read_group_names(lambda col: sheet.cell(row=HEADER_ROW, column=col).value)
+    schedule_data = _empty_schedule(group_names)
+
+    for day, rows in DAY_RANGES.items():
+        for row in rows:
+            _add_row(
+                schedule_data, group_names, day,
+                sheet.cell(row=row, column=NUMBER_COLUMN).value,
+                sheet.cell(row=row, column=TIME_COLUMN).value,
+                lambda col: sheet.cell(row=row, column=col),
+            )
+    schedule_data = _freeze(schedule_data)
+    _log_schedule(schedule_data)
     return schedule_data
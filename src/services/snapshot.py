@@ -0,0 +1,106 @@
+# src/services/snapshot.py
+import hashlib
+import json
+import logging
+import os
+import pickle
+import struct
+
+from services.parser import parse_schedule
+
+logger = logging.getLogger(__name__)
+
+# Снимок — это уже разобранный schedule_data курса, сохранённый рядом с xlsx.
+# Формат файла: MAGIC | версия (uint16) | длина заголовка (uint32) | заголовок JSON | pickle.
+# Версию нужно увеличивать при любом изменении структуры schedule_data.
+SNAPSHOT_MAGIC = b"RUDNSCHED"
+SNAPSHOT_VERSION = 4
+_PREFIX = struct.Struct(">HI")
+
+
+def snapshot_path(xlsx_path: str) -> str:
+    return os.path.splitext(xlsx_path)[0] + ".snapshot"
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_key(xlsx_path: str) -> dict:
+    """
+    Ключ исходного файла: размер, mtime и хэш содержимого.
+    """
+    st = os.stat(xlsx_path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": file_hash(xlsx_path)}
+
+
+def _read_header(f):
+    if f.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+        return None
+    prefix = f.read(_PREFIX.size)
+    if len(prefix) != _PREFIX.size:
+        return None
+    version, header_len = _PREFIX.unpack(prefix)
+    if version != SNAPSHOT_VERSION:
+        return None
+    return json.loads(f.read(header_len).decode("utf-8"))
+
+
+def save_snapshot(xlsx_path: str, schedule_data, key: dict):
+    """
+    Записывает снимок атомарно: во временный файл, затем os.replace.
+    """
+    path = snapshot_path(xlsx_path)
+    header = json.dumps(key).encode("utf-8")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_MAGIC)
+        f.write(_PREFIX.pack(SNAPSHOT_VERSION, len(header)))
+        f.write(header)
+        pickle.dump(schedule_data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(xlsx_path: str):
+    """
+    Возвращает schedule_data из снимка, если он соответствует текущему xlsx, иначе None.
+    Размер проверяется всегда; при совпадающем mtime хэш не пересчитывается,
+    при изменённом mtime снимок принимается, только если совпал хэш содержимого.
+    """
+    path = snapshot_path(xlsx_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        st = os.stat(xlsx_path)
+        with open(path, "rb") as f:
+            header = _read_header(f)
+            if header is None or header.get("size") != st.st_size:
+                return None
+            if header.get("mtime_ns") != st.st_mtime_ns:
+                if header.get("sha256") != file_hash(xlsx_path):
+                    return None
+            return pickle.load(f)
+    except Exception:
+        logger.exception("Не удалось прочитать снимок %s", path)
+        return None
+
+
+def load_or_parse(xlsx_path: str):
+    """
+    Загружает schedule_data из снимка или разбирает xlsx и сохраняет новый снимок.
+    Возвращает пару (schedule_data, from_snapshot).
+    """
+    schedule_data = load_snapshot(xlsx_path)
+    if schedule_data is not None:
+        return schedule_data, True
+    key = source_key(xlsx_path)
+    schedule_data = parse_schedule(xlsx_path)
+    try:
+        save_snapshot(xlsx_path, schedule_data, key)
+    except OSError:
+        logger.exception("Не удалось сохранить снимок для %s", xlsx_path)
+    return schedule_data, False
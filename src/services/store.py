@@ -0,0 +1,274 @@
+# src/services/store.py
+"""
+Общее хранилище расписаний в одном файле, отображаемом в память (mmap).
+
+Процесс-публикатор собирает разобранные расписания всех курсов в файл
+data/schedule.store и публикует новую версию атомарным переименованием.
+Остальные процессы отображают файл только для чтения: страницы файла
+общие для всех процессов через page cache ОС, поэтому память не растёт
+с числом воркеров. Объекты Lesson/Entry собираются из файла по запросу,
+а готовые тексты дней кэширует render_cache.
+
+Формат (little-endian), все секции — массивы записей фиксированного размера:
+  заголовок   HEADER
+  курсы       COURSE × n_courses  (строка курса, первая группа, число групп)
+  группы      I + II × days       (название группы, для каждого дня: первый урок, число уроков)
+  уроки       LESSON × n_lessons  (тип номера, номер, время, первая запись, число записей)
+  записи      ENTRY × n_entries   (text, upper, lower, search_text, program, flags)
+  индекс строк I × (n_strings + 1) — смещения строк в блоке
+  блок строк  UTF-8
+Строки хранятся один раз в таблице строк и адресуются номером.
+"""
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+
+from services.model import Entry, Lesson
+
+STORE_PATH = os.path.join("data", "schedule.store")
+STORE_MAGIC = b"RUDNSTOR"
+# Увеличивать при любом изменении формата
+STORE_VERSION = 1
+
+HEADER = struct.Struct("<8sHH5I4x6Q")
+COURSE = struct.Struct("<III")
+LESSON = struct.Struct("<IIIII")
+ENTRY = struct.Struct("<IIIIBB2x")
+STRING_OFFSET = struct.Struct("<I")
+NO_STRING = 0xFFFFFFFF
+
+# Типы номера пары в ячейке: пусто, целое, дробное, строка
+NUMBER_NONE, NUMBER_INT, NUMBER_FLOAT, NUMBER_STR = range(4)
+DAYS = 6
+
+
+def _group_struct(days):
+    return struct.Struct("<I" + "II" * days)
+
+
+class _StringTable:
+    def __init__(self):
+        self.ids = {}
+        self.values = []
+
+    def add(self, value):
+        if value is None:
+            return NO_STRING
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return string_id
+
+
+def _encode_number(number, strings):
+    if number is None:
+        return NUMBER_NONE, NO_STRING
+    if isinstance(number, int) and not isinstance(number, bool):
+        return NUMBER_INT, strings.add(str(number))
+    if isinstance(number, float):
+        return NUMBER_FLOAT, strings.add(repr(number))
+    return NUMBER_STR, strings.add(str(number))
+
+
+def _decode_number(tag, value):
+    if tag == NUMBER_INT:
+        return int(value)
+    if tag == NUMBER_FLOAT:
+        return float(value)
+    if tag == NUMBER_NONE:
+        return None
+    return value
+
+
+def build_store(courses, days=DAYS) -> bytes:
+    """
+    Собирает содержимое файла хранилища из {course: schedule_data}.
+    """
+    strings = _StringTable()
+    group_struct = _group_struct(days)
+    course_records, group_records, lesson_records, entry_records = [], [], [], []
+    for course, schedule_data in courses.items():
+        course_records.append(COURSE.pack(strings.add(str(course)), len(group_records), len(schedule_data)))
+        for group, group_days in schedule_data.items():
+            slots = []
+            for day in range(days):
+                lessons = group_days.get(day, ())
+                slots += [len(lesson_records), len(lessons)]
+                for lesson in lessons:
+                    tag, number_id = _encode_number(lesson.number, strings)
+                    lesson_records.append(LESSON.pack(
+                        tag, number_id, strings.add(lesson.time), len(entry_records), len(lesson.entries)
+                    ))
+                    for entry in lesson.entries:
+                        entry_records.append(ENTRY.pack(
+                            strings.add(entry.text), strings.add(entry.upper), strings.add(entry.lower),
+                            strings.add(entry.search_text), entry.program, entry.flags,
+                        ))
+            group_records.append(group_struct.pack(strings.add(group), *slots))
+
+    encoded = [value.encode("utf-8") for value in strings.values]
+    string_offsets = [0]
+    for value in encoded:
+        string_offsets.append(string_offsets[-1] + len(value))
+
+    sections = [
+        b"".join(course_records),
+        b"".join(group_records),
+        b"".join(lesson_records),
+        b"".join(entry_records),
+        b"".join(STRING_OFFSET.pack(offset) for offset in string_offsets),
+        b"".join(encoded),
+    ]
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        offsets.append(position)
+        position += len(section)
+    header = HEADER.pack(
+        STORE_MAGIC, STORE_VERSION, days,
+        len(course_records), len(group_records), len(lesson_records), len(entry_records), len(encoded),
+        *offsets,
+    )
+    return header + b"".join(sections)
+
+
+def publish_store(courses, path=STORE_PATH):
+    """
+    Записывает новую версию хранилища во временный файл и атомарно подменяет
+    им прежний. Процессы, отобразившие старую версию, дорабатывают с ней.
+    """
+    payload = build_store(courses)
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return len(payload)
+
+
+def store_stat(path=STORE_PATH):
+    """
+    (inode, size, mtime_ns) файла хранилища или None. Новая версия после
+    os.replace — это новый inode, поэтому изменение видно по stat.
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class ScheduleStore:
+    """
+    Отображённая в память версия хранилища. Файл открывается один раз;
+    после подмены файла объект продолжает читать свою версию.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.stat = (st.st_ino, st.st_size, st.st_mtime_ns)
+        (
+            magic, version, self.days,
+            n_courses, self.n_groups, self.n_lessons, self.n_entries, self.n_strings,
+            courses_off, self._groups_off, self._lessons_off, self._entries_off,
+            self._strings_index_off, self._strings_off,
+        ) = HEADER.unpack_from(self._mm, 0)
+        if magic != STORE_MAGIC or version != STORE_VERSION:
+            self._mm.close()
+            raise ValueError(f"{path}: неподдерживаемый формат хранилища расписаний")
+        self._group_struct = _group_struct(self.days)
+        self._courses = {}
+        for i in range(n_courses):
+            name_id, first_group, n_groups = COURSE.unpack_from(self._mm, courses_off + i * COURSE.size)
+            self._courses[self.string(name_id)] = (first_group, n_groups)
+
+    def string(self, string_id):
+        if string_id == NO_STRING:
+            return None
+        start, end = struct.unpack_from("<II", self._mm, self._strings_index_off + string_id * STRING_OFFSET.size)
+        return self._mm[self._strings_off + start:self._strings_off + end].decode("utf-8")
+
+    def courses(self):
+        return list(self._courses)
+
+    def course(self, course):
+        """
+        Расписание курса в виде отображения group -> {day: (Lesson, ...)}
+        с тем же интерфейсом, что и schedule_data из парсера.
+        """
+        first_group, n_groups = self._courses[str(course)]
+        return MappedCourse(self, first_group, n_groups)
+
+    def _group_record(self, index):
+        return self._group_struct.unpack_from(self._mm, self._groups_off + index * self._group_struct.size)
+
+    def _lessons(self, first, count):
+        lessons = []
+        for i in range(first, first + count):
+            tag, number_id, time_id, first_entry, n_entries = LESSON.unpack_from(
+                self._mm, self._lessons_off + i * LESSON.size
+            )
+            entries = []
+            for j in range(first_entry, first_entry + n_entries):
+                text_id, upper_id, lower_id, search_id, program, flags = ENTRY.unpack_from(
+                    self._mm, self._entries_off + j * ENTRY.size
+                )
+                entries.append(Entry(
+                    self.string(text_id), program, flags,
+                    self.string(upper_id), self.string(lower_id), self.string(search_id),
+                ))
+            lessons.append(Lesson(_decode_number(tag, self.string(number_id)), self.string(time_id), tuple(entries)))
+        return tuple(lessons)
+
+
+class MappedCourse(Mapping):
+    """
+    Группы курса в порядке исходного файла. Индекс названий групп небольшой
+    и строится при открытии; уроки читаются из файла при обращении.
+    """
+
+    def __init__(self, store, first_group, n_groups):
+        self._store = store
+        self._index = {
+            store.string(store._group_record(i)[0]): i
+            for i in range(first_group, first_group + n_groups)
+        }
+
+    def __getitem__(self, group):
+        return MappedGroup(self._store, self._index[group])
+
+    def __contains__(self, group):
+        return group in self._index
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+
+class MappedGroup(Mapping):
+    """
+    Дни группы: day -> кортеж Lesson, собранный из файла при обращении.
+    """
+
+    def __init__(self, store, index):
+        self._store = store
+        self._record = store._group_record(index)
+
+    def __getitem__(self, day):
+        if not isinstance(day, int) or not 0 <= day < self._store.days:
+            raise KeyError(day)
+        first, count = self._record[1 + day * 2], self._record[2 + day * 2]
+        return self._store._lessons(first, count)
+
+    def __iter__(self):
+        return iter(range(self._store.days))
+
+    def __len__(self):
+        return self._store.days
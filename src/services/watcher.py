@@ -0,0 +1,62 @@
+# src/services/watcher.py
+import logging
+import time
+from config import SCHEDULE_RELOAD_INTERVAL, SCHEDULE_STORE
+from services.cache import COURSES, attach_store, load_course, read_source_stat, source_stats, store_changed
+
+logger = logging.getLogger(__name__)
+
+# Файл, изменённый совсем недавно, может ещё дописываться — ждём следующей проверки
+SETTLE_SECONDS = 2
+# (size, mtime_ns) версий файла, которые не удалось разобрать: повторяем только после нового изменения
+_failed_stats = {}
+
+def changed_courses():
+    """
+    Возвращает список пар (course, stat) для курсов, чей xlsx изменился с момента загрузки.
+    """
+    now_ns = time.time_ns()
+    changed = []
+    for course in COURSES:
+        stat = read_source_stat(course)
+        if stat is None or stat == source_stats.get(course) or stat == _failed_stats.get(course):
+            continue
+        if now_ns - stat[1] < SETTLE_SECONDS * 1_000_000_000:
+            continue
+        changed.append((course, stat))
+    return changed
+
+async def reload_course(course, stat):
+    """
+    Разбирает изменившийся файл курса в пуле процессов и подменяет расписание в кэше.
+    При ошибке разбора остаётся предыдущая версия.
+    """
+    start = time.perf_counter()
+    try:
+        await load_course(course)
+    except Exception:
+        _failed_stats[course] = stat
+        logger.exception("Не удалось перечитать расписание курса %s, остаётся предыдущая версия", course)
+        return False
+    _failed_stats.pop(course, None)
+    logger.info("Расписание курса %s перезагружено за %.1f мс", course, (time.perf_counter() - start) * 1000)
+    return True
+
+async def check_schedule_updates(context):
+    # Воркер с SCHEDULE_STORE=map не разбирает xlsx: новые версии публикует другой процесс
+    if SCHEDULE_STORE == "map":
+        if store_changed():
+            attach_store()
+        return
+    for course, stat in changed_courses():
+        await reload_course(course, stat)
+
+def schedule_reload_jobs(job_queue):
+    if SCHEDULE_RELOAD_INTERVAL <= 0:
+        return
+    job_queue.run_repeating(
+        callback=check_schedule_updates,
+        interval=SCHEDULE_RELOAD_INTERVAL,
+        first=SCHEDULE_RELOAD_INTERVAL,
+        name="schedule_reload"
+    )
@@ -0,0 +1,54 @@
+# src/utils/concurrency.py
+import asyncio
+import functools
+import time
+import weakref
+from utils import metrics, profiling
+from config import SLOW_HANDLER_MS
+
+# Блокировки по пользователям. Словарь слабый: блокировка живёт, пока её держат
+# или ждут, поэтому словарь не растёт с числом пользователей.
+_user_locks = weakref.WeakValueDictionary()
+
+def user_lock(user_id) -> asyncio.Lock:
+    lock = _user_locks.get(user_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _user_locks[user_id] = lock
+    return lock
+
+def per_user(callback):
+    """
+    Оборачивает обработчик так, чтобы обновления одного пользователя
+    обрабатывались строго по очереди, даже при concurrent_updates.
+    Обновления разных пользователей по-прежнему идут параллельно.
+    При включённых метриках время обработки (вместе с ожиданием очереди
+    пользователя) пишется в bot_handler_seconds с именем обработчика,
+    а вызовы дольше SLOW_HANDLER_MS попадают в лог.
+    """
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        user = update.effective_user
+        if user is None:
+            return await callback(update, context)
+        async with user_lock(user.id):
+            return await callback(update, context)
+
+    if not metrics.ENABLED and SLOW_HANDLER_MS <= 0:
+        return wrapper
+    name = callback.__name__
+
+    @functools.wraps(callback)
+    async def timed_wrapper(update, context):
+        start = time.perf_counter()
+        try:
+            return await wrapper(update, context)
+        except Exception:
+            metrics.handler_errors.inc(name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.handler_seconds.observe(elapsed, name)
+            if SLOW_HANDLER_MS > 0:
+                profiling.log_if_slow(name, elapsed, update)
+    return timed_wrapper
@@ -1,109 +1,218 @@
 import os
 import json
+import time
+import asyncio
+import logging
+import threading
+from config import USERS_FLUSH_INTERVAL
+from utils.profile import UserProfile, check_fields
+
+logger = logging.getLogger(__name__)
 
 DB_PATH = os.path.join("data", "users.json")
 
-def load_users():
+# Пользователи держатся в памяти после первой загрузки. Изменения помечают
+# базу «грязной», а на диск её записывает flush() — периодически и при остановке.
+_users = None
+_dirty = False
+_lock = threading.RLock()
+# Запись файла целиком (снимок, fsync, переименование): периодический flush_job
+# и flush при остановке не должны писать один временный файл одновременно,
+# а более старый снимок — заменять собой более новый
+_flush_lock = threading.Lock()
+
+def _read_from_disk():
     if not os.path.exists(DB_PATH):
         return {}
     with open(DB_PATH, "r", encoding="utf-8") as f:
         try:
             return json.load(f)
         except json.JSONDecodeError:
-            return {}
+            pass
+    # Повреждённый файл не перезаписываем: откладываем его для ручного восстановления
+    broken_path = f"{DB_PATH}.corrupt-{int(time.time())}"
+    os.replace(DB_PATH, broken_path)
+    logger.error("Файл %s повреждён и сохранён как %s, база начата с нуля", DB_PATH, broken_path)
+    return {}
+
+def _load():
+    """
+    Рабочий словарь пользователей (загружается при первом обращении).
+    Изменять его можно только под _lock.
+    """
+    global _users
+    if _users is None:
+        with _lock:
+            if _users is None:
+                _users = _read_from_disk()
+    return _users
+
+def load_users():
+    """
+    Копия базы пользователей в виде users.json: вызывающий код может читать
+    её из другого потока, пока обработчики меняют настройки.
+    """
+    users = _load()
+    with _lock:
+        return {user_id: dict(user_data) for user_id, user_data in users.items()}
+
+def _mark_dirty():
+    global _dirty
+    _dirty = True
 
 def save_users(users):
-    with open(DB_PATH, "w", encoding="utf-8") as f:
-        json.dump(users, f, ensure_ascii=False, indent=2)
+    """
+    Заменяет базу копией users: дальнейшие изменения словаря вызывающим
+    кодом не попадают в базу мимо _lock.
+    """
+    global _users
+    users = {str(user_id): dict(user_data) for user_id, user_data in users.items()}
+    with _lock:
+        _users = users
+        _mark_dirty()
+
+def flush():
+    """
+    Записывает базу на диск, если она менялась: компактный JSON во временный файл,
+    fsync и атомарное переименование. Возвращает True, если запись была.
+    """
+    global _dirty
+    with _flush_lock:
+        with _lock:
+            if not _dirty or _users is None:
+                return False
+            payload = json.dumps(_users, ensure_ascii=False, separators=(",", ":"))
+            _dirty = False
+        tmp_path = f"{DB_PATH}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, DB_PATH)
+        except Exception:
+            _mark_dirty()
+            raise
+        return True
+
+async def flush_job(context):
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, flush)
+    except Exception:
+        logger.exception("Не удалось сохранить %s", DB_PATH)
+
+def schedule_flush_job(job_queue):
+    job_queue.run_repeating(
+        callback=flush_job,
+        interval=USERS_FLUSH_INTERVAL,
+        first=USERS_FLUSH_INTERVAL,
+        name="users_flush"
+    )
 
 def add_user_if_not_exists(user_id):
-    users = load_users()
+    users = _load()
     str_user_id = str(user_id)
-    if str_user_id not in users:
-        users[str_user_id] = {
-            "course": None,
-            "group": None,
-            "notification_time": None,
-            "subscribed": False,
-            "program": None,
-            "language": None
-        }
-        save_users(users)
+    with _lock:
+        if str_user_id not in users:
+            users[str_user_id] = {
+                "course": None,
+                "group": None,
+                "notification_time": None,
+                "subscribed": False,
+                "program": None,
+                "language": None
+            }
+            _mark_dirty()
+
+def get_profile(user_id) -> UserProfile:
+    """
+    Возвращает все настройки пользователя одним чтением.
+    Для неизвестного пользователя — профиль со значениями по умолчанию.
+    """
+    users = _load()
+    # Под блокировкой, чтобы не увидеть профиль, изменённый наполовину другим потоком
+    with _lock:
+        return UserProfile.from_dict(user_id, users.get(str(user_id), {}))
+
+def get_profiles(user_ids) -> list:
+    """
+    Профили нескольких пользователей за одно обращение (неизвестные пропускаются).
+    """
+    users = _load()
+    with _lock:
+        return [UserProfile.from_dict(uid, users[str(uid)]) for uid in user_ids if str(uid) in users]
+
+def find_subscribers(course, groups) -> list:
+    """
+    Профили подписчиков курса из указанных групп.
+    """
+    course, groups = str(course), set(groups)
+    users = _load()
+    with _lock:
+        return [
+            UserProfile.from_dict(uid, data) for uid, data in users.items()
+            if data.get("subscribed") and data.get("course") == course and data.get("group") in groups
+        ]
+
+def update_profile(user_id, **changes) -> UserProfile:
+    """
+    Создаёт пользователя при необходимости и применяет все изменения одной записью.
+    Возвращает обновлённый профиль.
+    """
+    check_fields(changes)
+    add_user_if_not_exists(user_id)
+    with _lock:
+        user_data = _load()[str(user_id)]
+        if changes:
+            user_data.update(changes)
+            _mark_dirty()
+        return UserProfile.from_dict(user_id, user_data)
+
+def _set_field(user_id, field, value):
+    add_user_if_not_exists(user_id)
+    with _lock:
+        _load()[str(user_id)][field] = value
+        _mark_dirty()
 
 def get_user_course(user_id):
-    users = load_users()
+    users = _load()
     return users.get(str(user_id), {}).get("course")
 
 def set_user_course(user_id, course):
-    users = load_users()
-    str_user_id = str(user_id)
-    if str_user_id not in users:
-        add_user_if_not_exists(user_id)
-        users = load_users()
-    users[str_user_id]["course"] = course
-    save_users(users)
+    _set_field(user_id, "course", course)
 
 def get_user_group(user_id):
-    users = load_users()
+    users = _load()
     return users.get(str(user_id), {}).get("group")
 
 def set_user_group(user_id, group):
-    users = load_users()
-    str_user_id = str(user_id)
-    if str_user_id not in users:
-        add_user_if_not_exists(user_id)
-        users = load_users()
-    users[str_user_id]["group"] = group
-    save_users(users)
+    _set_field(user_id, "group", group)
 
 def get_user_notification_time(user_id):
-    users = load_users()
+    users = _load()
     return users.get(str(user_id), {}).get("notification_time")
 
 def set_user_notification_time(user_id, time_str):
-    users = load_users()
-    str_user_id = str(user_id)
-    if str_user_id not in users:
-        add_user_if_not_exists(user_id)
-        users = load_users()
-    users[str_user_id]["notification_time"] = time_str
-    save_users(users)
+    _set_field(user_id, "notification_time", time_str)
 
 def get_user_subscribe_status(user_id):
-    users = load_users()
+    users = _load()
     return users.get(str(user_id), {}).get("subscribed")
 
 def set_user_subscribe_status(user_id, status: bool):
-    users = load_users()
-    str_user_id = str(user_id)
-    if str_user_id not in users:
-        add_user_if_not_exists(user_id)
-        users = load_users()
-    users[str_user_id]["subscribed"] = status
-    save_users(users)
+    _set_field(user_id, "subscribed", status)
 
 def get_user_program(user_id):
-    users = load_users()
+    users = _load()
     return users.get(str(user_id), {}).get("program")
 
 def set_user_program(user_id, program):
-    users = load_users()
-    str_user_id = str(user_id)
-    if str_user_id not in users:
-        add_user_if_not_exists(user_id)
-        users = load_users()
-    users[str_user_id]["program"] = program
-    save_users(users)
+    _set_field(user_id, "program", program)
 
 def get_user_language(user_id):
-    users = load_users()
+    users = _load()
     return users.get(str(user_id), {}).get("language")
 
 def set_user_language(user_id, language):
-    users = load_users()
-    str_user_id = str(user_id)
-    if str_user_id not in users:
-        add_user_if_not_exists(user_id)
-        users = load_users()
-    users[str_user_id]["language"] = language
-    save_users(users)
+    _set_field(user_id, "language", language)
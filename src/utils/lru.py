@@ -0,0 +1,58 @@
+# src/utils/lru.py
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Ограниченный по размеру LRU-кэш со счётчиками попаданий и промахов.
+    Используется из цикла событий, поэтому блокировок не содержит.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        try:
+            value = self._data[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, predicate=None):
+        """
+        Удаляет записи, для ключей которых predicate(key) истинно (или все записи).
+        Возвращает количество удалённых записей.
+        """
+        if predicate is None:
+            removed = len(self._data)
+            self._data.clear()
+            return removed
+        stale = [key for key in self._data if predicate(key)]
+        for key in stale:
+            del self._data[key]
+        return len(stale)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,279 @@
+# src/utils/metrics.py
+"""
+Встроенные метрики в текстовом формате Prometheus.
+
+Метрики включаются переменной METRICS_PORT (0 — выключены). В выключенном
+состоянии обёртки возвращают исходные функции, а observe()/inc() выходят
+сразу, поэтому на горячем пути остаётся одна проверка флага.
+
+Значения обновляются из цикла событий, из потоков хранилища и из потока
+HTTP-сервера (при чтении), поэтому каждая метрика защищена своей блокировкой.
+"""
+import functools
+import inspect
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import METRICS_ADDR, METRICS_PORT
+
+logger = logging.getLogger(__name__)
+
+ENABLED = METRICS_PORT > 0
+
+# Границы корзин гистограмм по умолчанию, секунды
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+_server = None
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        if not ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = list(self._values.items())
+        lines = self._header()
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    """
+    Значение снимается при каждом чтении: func() возвращает число
+    или, для метрики с метками, пары (кортеж меток, число).
+    """
+    kind = "gauge"
+
+    def __init__(self, name, documentation, func, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._func = func
+
+    def render(self):
+        try:
+            values = self._func()
+        except Exception:
+            logger.exception("Не удалось получить значение метрики %s", self.name)
+            return []
+        if not self.labelnames:
+            values = [((), values)]
+        lines = self._header()
+        for labels, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class CounterFunc(Gauge):
+    """
+    Счётчик, значение которого хранится в другом месте и снимается при чтении.
+    """
+    kind = "counter"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # метки -> [счётчики по корзинам..., сумма, количество]
+        self._values = {}
+
+    def observe(self, value, *labels):
+        if not ENABLED:
+            return
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self):
+        with self._lock:
+            values = [(labels, list(state)) for labels, state in self._values.items()]
+        lines = self._header()
+        for labels, state in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = ("le", _format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            le = ("le", "+Inf")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {state[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(state[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {state[-1]}")
+        return lines
+
+
+def timed(histogram, *labels):
+    """
+    Декоратор: записывает в histogram время выполнения функции (обычной или корутины).
+    При выключенных метриках возвращает функцию без изменений.
+    """
+    def decorator(func):
+        if not ENABLED:
+            return func
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start, *labels)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, *labels)
+        return wrapper
+    return decorator
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Общие метрики бота. Модули, где происходят события, импортируют их отсюда.
+handler_seconds = Histogram(
+    "bot_handler_seconds", "Время обработки обновления обработчиком", ("handler",)
+)
+handler_errors = Counter(
+    "bot_handler_errors_total", "Исключения в обработчиках", ("handler",)
+)
+schedule_load_seconds = Histogram(
+    "bot_schedule_load_seconds", "Загрузка расписания курса (снимок или разбор xlsx)", ("course", "source"),
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+user_store_seconds = Histogram(
+    "bot_user_store_seconds", "Операции хранилища пользователей", ("op",),
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5),
+)
+broadcast_messages = Counter(
+    "bot_broadcast_messages_total", "Сообщения ежедневной рассылки", ("result",)
+)
+broadcast_seconds = Histogram(
+    "bot_broadcast_seconds", "Длительность рассылки одного слота",
+    buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0),
+)
+
+# Кэши для метрик попаданий: имя -> функция, возвращающая (hits, misses)
+_caches = {}
+
+
+def register_cache(name, stats_func):
+    """
+    Регистрирует кэш для метрик попаданий. stats_func() возвращает (hits, misses).
+    """
+    _caches[name] = stats_func
+
+
+def _cache_values(index):
+    return [((name,), func()[index]) for name, func in _caches.items()]
+
+
+def _cache_ratios():
+    values = []
+    for name, func in _caches.items():
+        hits, misses = func()
+        total = hits + misses
+        values.append(((name,), hits / total if total else 0.0))
+    return values
+
+
+CounterFunc("bot_cache_hits_total", "Попадания в кэш", lambda: _cache_values(0), ("cache",))
+CounterFunc("bot_cache_misses_total", "Промахи кэша", lambda: _cache_values(1), ("cache",))
+Gauge("bot_cache_hit_ratio", "Доля попаданий в кэш с момента запуска", _cache_ratios, ("cache",))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics: " + format, *args)
+
+
+def start_server():
+    """
+    Поднимает HTTP-сервер /metrics в фоновом потоке, если метрики включены.
+    """
+    global _server
+    if not ENABLED or _server is not None:
+        return None
+    _server = ThreadingHTTPServer((METRICS_ADDR, METRICS_PORT), _Handler)
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    logger.info("Метрики доступны на http://%s:%s/metrics", METRICS_ADDR, METRICS_PORT)
+    return _server
+
+
+def stop_server():
+    global _server
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
@@ -0,0 +1,35 @@
+# src/utils/profile.py
+from dataclasses import dataclass, fields
+
+@dataclass(frozen=True, slots=True)
+class UserProfile:
+    """
+    Настройки пользователя, прочитанные из хранилища одним обращением.
+    """
+    user_id: str
+    course: str = None
+    group: str = None
+    notification_time: str = None
+    subscribed: bool = False
+    program: str = None
+    language: str = None
+
+    @classmethod
+    def from_dict(cls, user_id, data: dict):
+        return cls(
+            user_id=str(user_id),
+            course=data.get("course"),
+            group=data.get("group"),
+            notification_time=data.get("notification_time"),
+            subscribed=bool(data.get("subscribed")),
+            program=data.get("program"),
+            language=data.get("language"),
+        )
+
+# Поля, которые можно менять через update_profile
+PROFILE_FIELDS = tuple(f.name for f in fields(UserProfile) if f.name != "user_id")
+
+def check_fields(changes: dict):
+    unknown = set(changes) - set(PROFILE_FIELDS)
+    if unknown:
+        raise ValueError(f"Неизвестные поля профиля: {', '.join(sorted(unknown))}")
@@ -0,0 +1,178 @@
+# src/utils/profiling.py
+"""
+Профилирование по запросу.
+
+Окно профилирования ограничено по времени и включается переменной PROFILE_MODE
+при старте или командой администратора /profile. Режимы:
+  - "cpu"    — cProfile, дамп *.prof (смотреть через pstats или snakeviz);
+  - "memory" — tracemalloc, дамп *.tracemalloc (tracemalloc.Snapshot.load) и топ аллокаций в лог.
+
+Профилировщик окна работает в потоке цикла событий, поэтому охватывает
+обработчики обновлений и send_daily_schedule. Разбор xlsx в пуле процессов
+профилируется отдельно в каждом процессе (capture), дампы называются parse-<курс>-*.
+Все дампы пишутся в data/profiles/.
+"""
+import contextlib
+import cProfile
+import datetime
+import logging
+import os
+import time
+import tracemalloc
+from config import PROFILE_MODE, PROFILE_SECONDS, SLOW_HANDLER_MS
+
+logger = logging.getLogger(__name__)
+
+PROFILES_DIR = os.path.join("data", "profiles")
+MODES = ("cpu", "memory")
+# Сколько строк топа аллокаций писать в лог в режиме memory
+TOP_ALLOCATIONS = 15
+# Глубина стека, которую сохраняет tracemalloc
+TRACEMALLOC_FRAMES = 10
+
+# Текущее окно: {"mode", "profiler", "started", "deadline", "notify"} или None
+_session = None
+
+
+def _dump_path(name, mode):
+    os.makedirs(PROFILES_DIR, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    suffix = "prof" if mode == "cpu" else "tracemalloc"
+    return os.path.join(PROFILES_DIR, f"{name}-{stamp}-{os.getpid()}.{suffix}")
+
+
+def _log_top_allocations(snapshot, name):
+    stats = snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+    logger.info("Топ аллокаций (%s):\n%s", name, "\n".join(str(stat) for stat in stats))
+
+
+def active_mode():
+    """
+    Режим текущего окна профилирования или None.
+    """
+    return _session["mode"] if _session else None
+
+
+def start(mode, seconds=PROFILE_SECONDS, notify=None):
+    """
+    Открывает окно профилирования в текущем потоке (потоке цикла событий).
+    notify — необязательная функция notify(path), вызываемая после записи дампа.
+    Возвращает False, если окно уже открыто.
+    """
+    global _session
+    if mode not in MODES:
+        raise ValueError(f"Неизвестный режим профилирования: {mode}")
+    if _session is not None:
+        return False
+    profiler = None
+    if mode == "cpu":
+        profiler = cProfile.Profile()
+        profiler.enable()
+    elif not tracemalloc.is_tracing():
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    now = time.monotonic()
+    _session = {"mode": mode, "profiler": profiler, "started": now, "deadline": now + seconds, "notify": notify}
+    logger.info("Профилирование (%s) запущено на %d с", mode, seconds)
+    return True
+
+
+def stop(notify=True):
+    """
+    Закрывает окно и записывает дамп. Возвращает путь к дампу или None, если окна не было.
+    notify=False — не вызывать функцию уведомления окна (вызывающий сообщит сам).
+    """
+    global _session
+    session, _session = _session, None
+    if session is None:
+        return None
+    mode = session["mode"]
+    path = _dump_path("loop", mode)
+    if mode == "cpu":
+        session["profiler"].disable()
+        session["profiler"].dump_stats(path)
+    else:
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        snapshot.dump(path)
+        _log_top_allocations(snapshot, "окно")
+    logger.info(
+        "Профилирование (%s) остановлено через %.1f с, дамп: %s",
+        mode, time.monotonic() - session["started"], path
+    )
+    if notify and session["notify"] is not None:
+        session["notify"](path)
+    return path
+
+
+def remaining_seconds():
+    if _session is None:
+        return 0.0
+    return max(0.0, _session["deadline"] - time.monotonic())
+
+
+@contextlib.contextmanager
+def capture(name, mode):
+    """
+    Профилирует блок целиком и пишет отдельный дамп. Используется в процессах пула,
+    где окно цикла событий не действует. mode=None — без профилирования.
+    """
+    if mode not in MODES:
+        yield
+        return
+    if mode == "cpu":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(_dump_path(name, mode))
+        return
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start(TRACEMALLOC_FRAMES)
+    try:
+        yield
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        if not tracing:
+            tracemalloc.stop()
+        snapshot.dump(_dump_path(name, mode))
+        _log_top_allocations(snapshot, name)
+
+
+def start_from_env():
+    """
+    Открывает окно, если задан PROFILE_MODE. Вызывается в main() до прогрева кэша,
+    чтобы в дамп попал и первоначальный разбор расписаний.
+    """
+    if PROFILE_MODE:
+        start(PROFILE_MODE)
+
+
+async def _stop_job(context):
+    # Окно могли закрыть вручную и открыть новое — закрываем только своё
+    if _session is not None and _session["started"] == context.job.data:
+        stop()
+
+
+def schedule_stop(job_queue):
+    """
+    Планирует закрытие текущего окна по истечении его времени.
+    """
+    if _session is not None:
+        job_queue.run_once(_stop_job, remaining_seconds(), data=_session["started"], name="profiling_stop")
+
+
+def log_if_slow(name, elapsed, update):
+    """
+    Пишет в лог вызов обработчика дольше SLOW_HANDLER_MS.
+    """
+    elapsed_ms = elapsed * 1000
+    if elapsed_ms < SLOW_HANDLER_MS:
+        return
+    user = getattr(update, "effective_user", None)
+    logger.warning(
+        "Медленный обработчик %s: %.0f мс (пользователь %s)",
+        name, elapsed_ms, user.id if user else None
+    )
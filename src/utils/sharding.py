@@ -0,0 +1,28 @@
+# src/utils/sharding.py
+"""
+Шард текущего процесса при запуске через dispatcher.py.
+
+Диспетчер отправляет обновление воркеру shard_of(id отправителя, count), поэтому
+все обновления одного пользователя обрабатывает один процесс. Тем же правилом
+воркер выбирает «своих» подписчиков для рассылок, чтобы сообщение уходило один раз.
+При обычном запуске bot.py процесс один и владеет всеми пользователями.
+"""
+
+SHARD_INDEX = 0
+SHARD_COUNT = 1
+
+
+def configure(index, count):
+    global SHARD_INDEX, SHARD_COUNT
+    SHARD_INDEX, SHARD_COUNT = index, count
+
+
+def shard_of(key, count) -> int:
+    return int(key) % count
+
+
+def owns(user_id) -> bool:
+    """
+    True, если пользователь относится к шарду этого процесса.
+    """
+    return SHARD_COUNT == 1 or shard_of(user_id, SHARD_COUNT) == SHARD_INDEX
@@ -0,0 +1,300 @@
+# src/utils/sqlite_db.py
+"""
+Хранилище пользователей в SQLite (режим WAL).
+Функции повторяют API utils/json_db.py, поэтому бэкенды взаимозаменяемы.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+from utils.profile import UserProfile, check_fields
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.path.join("data", "users.db")
+# Файл прежнего хранилища, из которого один раз переносятся пользователи
+JSON_PATH = os.path.join("data", "users.json")
+
+# Поля профиля и соответствующие им столбцы ("group" — ключевое слово SQL)
+FIELDS = {
+    "course": "course",
+    "group": "group_name",
+    "notification_time": "notification_time",
+    "subscribed": "subscribed",
+    "program": "program",
+    "language": "language",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    course TEXT,
+    group_name TEXT,
+    notification_time TEXT,
+    subscribed INTEGER NOT NULL DEFAULT 0,
+    program TEXT,
+    language TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_users_subscribed ON users(subscribed);
+CREATE INDEX IF NOT EXISTS idx_users_notification_time ON users(notification_time);
+CREATE INDEX IF NOT EXISTS idx_users_course_group ON users(course, group_name);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Сколько user_id передавать в одном запросе IN (...)
+_BATCH_SIZE = 500
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized_paths = set()
+
+
+def _connect():
+    """
+    Возвращает соединение текущего потока. Схема и перенос из JSON выполняются
+    один раз для каждого пути к базе.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and getattr(_local, "path", None) == DB_PATH:
+        return conn
+    if conn is not None:
+        conn.close()
+    conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    with _init_lock:
+        if DB_PATH not in _initialized_paths:
+            conn.executescript(_SCHEMA)
+            _migrate_from_json(conn)
+            _initialized_paths.add(DB_PATH)
+    _local.conn = conn
+    _local.path = DB_PATH
+    return conn
+
+
+def close():
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+def _row_values(user_id, user_data):
+    return (
+        str(user_id),
+        user_data.get("course"),
+        user_data.get("group"),
+        user_data.get("notification_time"),
+        1 if user_data.get("subscribed") else 0,
+        user_data.get("program"),
+        user_data.get("language"),
+    )
+
+
+def _upsert_many(conn, users):
+    conn.executemany(
+        "INSERT INTO users (user_id, course, group_name, notification_time, subscribed, program, language) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT(user_id) DO UPDATE SET course=excluded.course, group_name=excluded.group_name, "
+        "notification_time=excluded.notification_time, subscribed=excluded.subscribed, "
+        "program=excluded.program, language=excluded.language",
+        [_row_values(user_id, user_data) for user_id, user_data in users.items()],
+    )
+
+
+def _migrate_from_json(conn):
+    """
+    Однократный перенос пользователей из users.json. Отметка о переносе
+    хранится в таблице meta, исходный файл не удаляется.
+    """
+    # Несколько процессов (воркеры dispatcher.py) могут стартовать одновременно:
+    # отметка проверяется повторно уже под блокировкой записи
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if conn.execute("SELECT 1 FROM meta WHERE key = 'migrated_from_json'").fetchone():
+            conn.execute("COMMIT")
+            return
+        users = {}
+        if os.path.exists(JSON_PATH):
+            with open(JSON_PATH, "r", encoding="utf-8") as f:
+                users = json.load(f)
+            _upsert_many(conn, users)
+        conn.execute(
+            "INSERT OR IGNORE INTO meta (key, value) VALUES ('migrated_from_json', ?)", (str(len(users)),)
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    if users:
+        logger.info("Перенесено пользователей из %s: %d", JSON_PATH, len(users))
+
+
+def _row_to_dict(row):
+    return {
+        "course": row["course"],
+        "group": row["group_name"],
+        "notification_time": row["notification_time"],
+        "subscribed": bool(row["subscribed"]),
+        "program": row["program"],
+        "language": row["language"],
+    }
+
+
+def load_users():
+    """
+    Возвращает всех пользователей в том же виде, что и users.json.
+    """
+    rows = _connect().execute("SELECT * FROM users").fetchall()
+    return {row["user_id"]: _row_to_dict(row) for row in rows}
+
+
+def save_users(users):
+    """
+    Сохраняет переданных пользователей одной транзакцией.
+    """
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _upsert_many(conn, users)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def add_user_if_not_exists(user_id):
+    _connect().execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (str(user_id),))
+
+
+def _get_field(user_id, field):
+    column = FIELDS[field]
+    row = _connect().execute(f"SELECT {column} FROM users WHERE user_id = ?", (str(user_id),)).fetchone()
+    if row is None:
+        return None
+    return bool(row[0]) if field == "subscribed" else row[0]
+
+
+def _set_field(user_id, field, value):
+    column = FIELDS[field]
+    if field == "subscribed":
+        value = 1 if value else 0
+    _connect().execute(
+        f"INSERT INTO users (user_id, {column}) VALUES (?, ?) "
+        f"ON CONFLICT(user_id) DO UPDATE SET {column} = excluded.{column}",
+        (str(user_id), value),
+    )
+
+
+def get_profile(user_id) -> UserProfile:
+    """
+    Возвращает все настройки пользователя одним запросом.
+    Для неизвестного пользователя — профиль со значениями по умолчанию.
+    """
+    row = _connect().execute("SELECT * FROM users WHERE user_id = ?", (str(user_id),)).fetchone()
+    return UserProfile.from_dict(user_id, _row_to_dict(row) if row else {})
+
+
+def get_profiles(user_ids) -> list:
+    """
+    Профили нескольких пользователей пакетными запросами (неизвестные пропускаются).
+    """
+    conn = _connect()
+    user_ids = [str(uid) for uid in user_ids]
+    profiles = []
+    for start in range(0, len(user_ids), _BATCH_SIZE):
+        chunk = user_ids[start:start + _BATCH_SIZE]
+        rows = conn.execute(
+            f"SELECT * FROM users WHERE user_id IN ({', '.join('?' * len(chunk))})", chunk
+        ).fetchall()
+        profiles.extend(UserProfile.from_dict(row["user_id"], _row_to_dict(row)) for row in rows)
+    return profiles
+
+
+def find_subscribers(course, groups) -> list:
+    """
+    Профили подписчиков курса из указанных групп.
+    """
+    conn = _connect()
+    groups = list(groups)
+    profiles = []
+    for start in range(0, len(groups), _BATCH_SIZE):
+        chunk = groups[start:start + _BATCH_SIZE]
+        rows = conn.execute(
+            f"SELECT * FROM users WHERE subscribed = 1 AND course = ? "
+            f"AND group_name IN ({', '.join('?' * len(chunk))})",
+            [str(course), *chunk],
+        ).fetchall()
+        profiles.extend(UserProfile.from_dict(row["user_id"], _row_to_dict(row)) for row in rows)
+    return profiles
+
+
+def update_profile(user_id, **changes) -> UserProfile:
+    """
+    Создаёт пользователя при необходимости и применяет все изменения одной транзакцией.
+    Возвращает обновлённый профиль.
+    """
+    check_fields(changes)
+    if "subscribed" in changes:
+        changes["subscribed"] = 1 if changes["subscribed"] else 0
+    columns = [FIELDS[field] for field in changes]
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if columns:
+            assignments = ", ".join(f"{column} = excluded.{column}" for column in columns)
+            conn.execute(
+                f"INSERT INTO users (user_id, {', '.join(columns)}) VALUES (?{', ?' * len(columns)}) "
+                f"ON CONFLICT(user_id) DO UPDATE SET {assignments}",
+                (str(user_id), *changes.values()),
+            )
+        else:
+            conn.execute("INSERT OR IGNORE INTO users (user_id) VALUES (?)", (str(user_id),))
+        row = conn.execute("SELECT * FROM users WHERE user_id = ?", (str(user_id),)).fetchone()
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return UserProfile.from_dict(user_id, _row_to_dict(row))
+
+
+def get_user_course(user_id):
+    return _get_field(user_id, "course")
+
+def set_user_course(user_id, course):
+    _set_field(user_id, "course", course)
+
+def get_user_group(user_id):
+    return _get_field(user_id, "group")
+
+def set_user_group(user_id, group):
+    _set_field(user_id, "group", group)
+
+def get_user_notification_time(user_id):
+    return _get_field(user_id, "notification_time")
+
+def set_user_notification_time(user_id, time_str):
+    _set_field(user_id, "notification_time", time_str)
+
+def get_user_subscribe_status(user_id):
+    return _get_field(user_id, "subscribed")
+
+def set_user_subscribe_status(user_id, status: bool):
+    _set_field(user_id, "subscribed", status)
+
+def get_user_program(user_id):
+    return _get_field(user_id, "program")
+
+def set_user_program(user_id, program):
+    _set_field(user_id, "program", program)
+
+def get_user_language(user_id):
+    return _get_field(user_id, "language")
+
+def set_user_language(user_id, language):
+    _set_field(user_id, "language", language)
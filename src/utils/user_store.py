@@ -0,0 +1,66 @@
+# src/utils/user_store.py
+"""
+Точка доступа к базе пользователей. Бэкенд выбирается переменной USER_STORE:
+"sqlite" (по умолчанию, data/users.db) или "json" (data/users.json).
+Обработчики импортируют функции отсюда, а не из конкретного модуля.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from config import USER_STORE
+from utils import metrics
+
+if USER_STORE == "json":
+    from utils import json_db as backend
+else:
+    from utils import sqlite_db as backend
+
+# Основные операции хранилища пишут задержку в bot_user_store_seconds (при выключенных метриках — без обёрток)
+load_users = metrics.timed(metrics.user_store_seconds, "load_users")(backend.load_users)
+save_users = metrics.timed(metrics.user_store_seconds, "save_users")(backend.save_users)
+add_user_if_not_exists = backend.add_user_if_not_exists
+get_profile = metrics.timed(metrics.user_store_seconds, "get_profile")(backend.get_profile)
+get_profiles = metrics.timed(metrics.user_store_seconds, "get_profiles")(backend.get_profiles)
+update_profile = metrics.timed(metrics.user_store_seconds, "update_profile")(backend.update_profile)
+find_subscribers = metrics.timed(metrics.user_store_seconds, "find_subscribers")(backend.find_subscribers)
+get_user_course = backend.get_user_course
+set_user_course = backend.set_user_course
+get_user_group = backend.get_user_group
+set_user_group = backend.set_user_group
+get_user_notification_time = backend.get_user_notification_time
+set_user_notification_time = backend.set_user_notification_time
+get_user_subscribe_status = backend.get_user_subscribe_status
+set_user_subscribe_status = backend.set_user_subscribe_status
+get_user_program = backend.get_user_program
+set_user_program = backend.set_user_program
+get_user_language = backend.get_user_language
+set_user_language = backend.set_user_language
+
+
+def flush_users():
+    """
+    Сбрасывает на диск отложенные изменения (только для USER_STORE=json).
+    """
+    if USER_STORE == "json":
+        return metrics.timed(metrics.user_store_seconds, "flush")(backend.flush)()
+    return False
+
+
+def schedule_store_jobs(job_queue):
+    """
+    Регистрирует периодическую запись users.json (только для USER_STORE=json).
+    """
+    if USER_STORE == "json":
+        backend.schedule_flush_job(job_queue)
+
+
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="user_store")
+
+
+async def run_in_store(func, *args, **kwargs):
+    """
+    Выполняет функцию хранилища в отдельном потоке, не блокируя цикл событий.
+    Подходит для тяжёлых операций, например load_users() при рассылке.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, partial(func, *args, **kwargs))
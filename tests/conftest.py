@@ -0,0 +1,6 @@
+# tests/conftest.py
+import os
+import sys
+
+# Модули бота импортируются так же, как при запуске из src/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
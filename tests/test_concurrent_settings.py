@@ -0,0 +1,111 @@
+# tests/test_concurrent_settings.py
+"""
+Отсутствие потерянных обновлений при параллельной обработке.
+
+Сотни нажатий в /settings (группа, время, язык) и /subscribe для многих
+пользователей запускаются одновременно, часть изменений дополнительно
+идёт из потоков через run_in_store. В конце у каждого пользователя должны
+оказаться все установленные значения.
+
+Хранилище выбирается при импорте utils.user_store по USER_STORE, поэтому
+каждый бэкенд проверяется в отдельном процессе — этим же файлом, запущенным
+как скрипт в пустом каталоге с data/.
+"""
+import asyncio
+import os
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+USERS = 200
+
+
+class FakeQuery:
+    def __init__(self, user_id, data):
+        self.from_user = SimpleNamespace(id=user_id)
+        self.data = data
+        # Нет исходного сообщения: settings_handler не сравнивает правку с ним
+        self.message = None
+
+    async def answer(self, *args, **kwargs):
+        await asyncio.sleep(0)
+
+    async def edit_message_text(self, *args, **kwargs):
+        await asyncio.sleep(0)
+
+    async def edit_message_reply_markup(self, *args, **kwargs):
+        await asyncio.sleep(0)
+
+
+class FakeMessage:
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+
+    async def reply_text(self, *args, **kwargs):
+        await asyncio.sleep(0)
+
+
+def callback_update(user_id, data):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id), callback_query=FakeQuery(user_id, data))
+
+
+def command_update(user_id):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id), message=FakeMessage(user_id))
+
+
+async def fire_updates(users):
+    from handlers.settings_handler import settings_callback_handler
+    from handlers.subscribe_handler import subscribe_handler
+    from utils.user_store import run_in_store, update_profile
+
+    context = SimpleNamespace(user_data={})
+    settings = settings_callback_handler.callback
+    subscribe = subscribe_handler.callback
+    tasks = []
+    for user_id in range(1, users + 1):
+        tasks.append(settings(callback_update(user_id, f"set_group:G{user_id}:0"), context))
+        tasks.append(settings(callback_update(user_id, "set_time:08:00"), context))
+        tasks.append(settings(callback_update(user_id, f"set_language:L{user_id}"), context))
+        tasks.append(subscribe(command_update(user_id), context))
+        tasks.append(run_in_store(update_profile, user_id, program="МП"))
+    await asyncio.gather(*tasks)
+
+
+def lost_updates(users):
+    """
+    Пользователи, у которых после параллельных изменений не хватает значений.
+    """
+    from utils.user_store import get_profile
+
+    asyncio.run(fire_updates(users))
+    lost = []
+    for user_id in range(1, users + 1):
+        profile = get_profile(user_id)
+        expected = (f"G{user_id}", f"L{user_id}", True, "МП")
+        actual = (profile.group, profile.language, profile.subscribed, profile.program)
+        # /subscribe и set_time идут в произвольном порядке, подходит любое из двух значений
+        if actual != expected or profile.notification_time not in ("08:00", "20:00"):
+            lost.append((user_id, actual, profile.notification_time))
+    return lost
+
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_concurrent_settings_lose_no_updates(backend, tmp_path):
+    (tmp_path / "data").mkdir()
+    env = dict(os.environ, USER_STORE=backend)
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), str(USERS)],
+        cwd=tmp_path, env=env, capture_output=True, text=True, timeout=300,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, SRC_DIR)
+    lost = lost_updates(int(sys.argv[1]) if len(sys.argv) > 1 else USERS)
+    if lost:
+        print(f"Потеряно обновлений у {len(lost)} пользователей, например: {lost[:3]}")
+        sys.exit(1)
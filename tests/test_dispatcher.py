@@ -0,0 +1,37 @@
+# tests/test_dispatcher.py
+import logging
+import signal
+import threading
+from types import SimpleNamespace
+
+import dispatcher
+
+
+def test_run_webhook_serves_when_set_webhook_fails(monkeypatch, caplog):
+    """
+    Без связи с Telegram (нагрузочный тест на заглушке) регистрация вебхука
+    падает, но сервер всё равно поднимается и останавливается по SIGTERM.
+    """
+    async def failing_set_webhook(url):
+        raise ConnectionError("Bot API недоступен")
+
+    handlers = {}
+    monkeypatch.setattr(dispatcher, "_set_webhook", failing_set_webhook)
+    monkeypatch.setattr(dispatcher, "WEBHOOK_LISTEN", "127.0.0.1")
+    monkeypatch.setattr(dispatcher, "WEBHOOK_PORT", 0)
+    monkeypatch.setattr(dispatcher, "WEBHOOK_URL", "https://bot.example.com/telegram")
+    monkeypatch.setattr(signal, "signal", lambda signum, handler: handlers.__setitem__(signum, handler))
+
+    # SIGTERM «приходит», как только сервер начал принимать запросы
+    def stop_when_serving():
+        while signal.SIGTERM not in handlers:
+            threading.Event().wait(0.01)
+        handlers[signal.SIGTERM](signal.SIGTERM, None)
+
+    stopper = threading.Thread(target=stop_when_serving, daemon=True)
+    stopper.start()
+    with caplog.at_level(logging.ERROR, logger=dispatcher.logger.name):
+        dispatcher.run_webhook(SimpleNamespace(workers=[]))
+    stopper.join(timeout=5)
+
+    assert "Не удалось зарегистрировать вебхук https://bot.example.com/telegram" in caplog.text